@@ -0,0 +1,126 @@
+"""
+Time the JSON work of a run with the standard library and with orjson (when installed) behind utils.codec,
+and compare DataCorrelation.get_property_value with the earlier version that decoded nested JSON on every lookup.
+
+Run from the application directory:
+    python benchmarks/bench_codec.py
+"""
+import gc
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import codec
+from data_correlation.data_correlation import DataCorrelation
+
+NESTED_PATHS = ["CI Name", "IP Address", "Details.network.ip", "Details.network.mac", "Details.owner.name", "Details.owner.site"]
+# Paths crossing plain (non-JSON) strings
+PLAIN_PATHS = ["CI Name.x", "IP Address.y"]
+
+
+def legacy_get_property_value(api_data, property_path):
+    """get_property_value before utils.codec: every string on the path is decoded with json.loads."""
+    value = api_data
+    for key in property_path.split('.'):
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except json.JSONDecodeError:
+                return value
+        if isinstance(value, list):
+            value = next((item.get(key, None) for item in value if isinstance(item, dict)), None)
+        if value is None:
+            return None
+        value = value.get(key, None)
+    return value
+
+
+def make_ci(n):
+    ci = {f"FIELD_{i}": f"value {n} {i}" for i in range(40)}
+    ci["ATTRIBUTE"] = [{"attribute_name": f"attr_{a}", "attr_value": f"v{n}-{a}", "attribute_id": a} for a in range(220)]
+    ci["TAG"] = {"tag_data": [{"tag_name": f"tag_{t}", "tag_value": f"t{n}", "tag_mandatory": False} for t in range(25)]}
+    return ci
+
+
+def make_workload():
+    random.seed(3)
+    page = json.dumps({"meta": {"totalPageCount": 1}, "data": [make_ci(n) for n in range(1000)]}).encode()
+    upload = {"meta": {"pushToCMDB": "yes"}, "data": [{
+        "ciName": f"host{i}", "ipAddress": f"10.0.{i % 250}.{i % 200}", "status": "Active", "companyName": "Example Ltd",
+        "tag": {"tag_data": [{"tag_name": "test", "tag_value": "x", "tag_mandatory": False}]}
+    } for i in range(1000)]}
+    cache = {"records": {
+        "bf_to_sx": {str(i): "%040x" % random.getrandbits(160) for i in range(100000)},
+        "bf_snapshot": {str(i): {"last_report_time": "Mon, 01 Jan 2024 10:00:00 +0000", "details": {
+            "ID": str(i), "Computer Name": f"host{i}", "IP Address": "10.0.0.1", "Client Settings": "Status=Active, Category=Server"
+        }} for i in range(40000)}
+    }}
+    nested_records = [{
+        "CI Name": f"host{i}",
+        "IP Address": f"10.0.0.{i % 250}",
+        "Details": json.dumps({"network": {"ip": f"10.0.0.{i % 250}", "mac": "00:11"}, "owner": {"name": "ops", "site": "A"}, "extra": list(range(50))})
+    } for i in range(20000)]
+    return page, upload, cache, nested_records
+
+
+def best_of(function, repeat=5):
+    gc.disable()
+    try:
+        timings = []
+        for _ in range(repeat):
+            codec._loads_nested.cache_clear()
+            started = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+    finally:
+        gc.enable()
+
+
+def use_backend(orjson_module):
+    codec.orjson = orjson_module
+    codec.ORJSON_OPTIONS = orjson_module.OPT_NON_STR_KEYS if orjson_module is not None else 0
+
+
+def main():
+    page, upload, cache, nested_records = make_workload()
+    cache_text = codec.dumps_bytes(cache)
+
+    assert [legacy_get_property_value(record, path) for record in nested_records[:50] for path in NESTED_PATHS + PLAIN_PATHS] == \
+        [DataCorrelation.get_property_value(record, path) for record in nested_records[:50] for path in NESTED_PATHS + PLAIN_PATHS]
+
+    backends = {"stdlib": None}
+    if codec.orjson is not None:
+        backends["orjson"] = codec.orjson
+    else:
+        print("orjson is not installed; timing the standard library only.")
+
+    cases = [
+        (f"decode SX page (1000 CIs, {len(page) / 1e6:.1f} MB)", lambda: codec.loads(page), 5),
+        ("encode SX upload page (1000 records)", lambda: codec.dumps(upload), 5),
+        (f"decode cache file ({len(cache_text) / 1e6:.1f} MB)", lambda: codec.loads(cache_text), 3),
+        ("encode cache file", lambda: codec.dumps_bytes(cache), 3),
+        ("get_property_value, 20k records x 6 nested paths", lambda: [DataCorrelation.get_property_value(r, p) for r in nested_records for p in NESTED_PATHS], 5),
+        ("get_property_value, 20k records x 2 plain paths", lambda: [DataCorrelation.get_property_value(r, p) for r in nested_records for p in PLAIN_PATHS], 5),
+    ]
+    results = {}
+    try:
+        for backend, orjson_module in backends.items():
+            use_backend(orjson_module)
+            results[backend] = [best_of(function, repeat) for _, function, repeat in cases]
+    finally:
+        use_backend(backends.get("orjson"))
+
+    for position, (name, _, _) in enumerate(cases):
+        print(f"{name}: " + ", ".join(f"{backend} {timings[position]:.3f}s" for backend, timings in results.items()))
+
+    print(f"legacy get_property_value, 20k records x 6 nested paths: {best_of(lambda: [legacy_get_property_value(r, p) for r in nested_records for p in NESTED_PATHS]):.3f}s")
+    print(f"legacy get_property_value, 20k records x 2 plain paths: {best_of(lambda: [legacy_get_property_value(r, p) for r in nested_records for p in PLAIN_PATHS]):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
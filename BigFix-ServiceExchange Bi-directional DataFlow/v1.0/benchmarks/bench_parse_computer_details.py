@@ -0,0 +1,115 @@
+"""
+Compare SXAPIHandler.parse_computer_details with the earlier version that scanned the ATTRIBUTE and
+TAG lists of a CI once per configured property, on a synthetic page of 5000 CIs.
+
+Run from the application directory:
+    python benchmarks/bench_parse_computer_details.py [number of technical properties]
+"""
+import gc
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sx_data_operations.api_handler as api_handler
+from sx_data_operations.api_handler import SXAPIHandler
+
+ATTRIBUTE_NAMES = [f"attr_{i}" for i in range(220)]
+TAG_NAMES = [f"tag_{i}" for i in range(25)]
+
+
+def legacy_parse_computer_details(properties, response_json):
+    """parse_computer_details before the property plan, without its per-record logging."""
+    processed_data = []
+    for computer in response_json.get('data', []):
+        entry = {}
+        for display_name, prop_info in properties.items():
+            propertyname = prop_info.get("propertyname")
+            proptype = prop_info.get("type")
+
+            value = None
+            if proptype == "general":
+                value = computer.get(propertyname)
+            elif proptype == "technical":
+                for attr in computer.get("ATTRIBUTE", []):
+                    if attr.get("attribute_name") == propertyname:
+                        value = attr.get("attr_value")
+                        break
+            elif proptype == "custom":
+                for tag in computer.get("TAG", {}).get("tag_data", []):
+                    if tag.get("tag_name") == propertyname:
+                        value = tag.get("tag_value")
+                        break
+
+            if isinstance(value, list):
+                entry[propertyname] = ", ".join(str(v) for v in value)
+            else:
+                entry[propertyname] = str(value) if value is not None else ""
+        processed_data.append(entry)
+    return processed_data
+
+
+def make_properties(technical_count):
+    random.seed(2)
+    properties = {}
+    for i in range(10):
+        properties[f"General {i}"] = {"propertyname": f"FIELD_{i}", "type": "general"}
+    for i in range(technical_count):
+        properties[f"Technical {i}"] = {"propertyname": random.choice(ATTRIBUTE_NAMES[100:]), "type": "technical"}
+    for i in range(5):
+        properties[f"Custom {i}"] = {"propertyname": random.choice(TAG_NAMES), "type": "custom"}
+    return properties
+
+
+def make_ci(n):
+    ci = {f"FIELD_{i}": f"v{n}_{i}" for i in range(40)}
+    attributes = [{"attribute_name": name, "attr_value": f"{name}-{n}", "attribute_id": i} for i, name in enumerate(ATTRIBUTE_NAMES)]
+    random.shuffle(attributes)
+    ci["ATTRIBUTE"] = attributes
+    ci["TAG"] = {"tag_data": [{"tag_name": name, "tag_value": f"{name}-{n}", "tag_mandatory": False} for name in TAG_NAMES]}
+    return ci
+
+
+def best_of(function, repeat=5):
+    gc.disable()
+    try:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+    finally:
+        gc.enable()
+
+
+class _Quiet:
+    def info(self, *args, **kwargs):
+        pass
+
+
+def main():
+    technical_count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    properties = make_properties(technical_count)
+    payload = {"data": [make_ci(n) for n in range(5000)]}
+    handler = SXAPIHandler(
+        config_path=None, record_limit=1000, base_url="https://sx.example", username="user", password="password",
+        proxy_url=None, proxy_username=None, proxy_password=None, verify=False, x_user_payload=None,
+        sx_properties_sx_to_bf=properties, delta=None
+    )
+
+    # The per-record log and print calls would dominate both timings
+    api_handler.logger = _Quiet()
+    api_handler.print = lambda *args, **kwargs: None
+
+    assert legacy_parse_computer_details(properties, payload) == handler.parse_computer_details(payload)
+
+    legacy = best_of(lambda: legacy_parse_computer_details(properties, payload))
+    planned = best_of(lambda: handler.parse_computer_details(payload))
+    print(f"5000 CIs, {technical_count} technical properties: per-property scan {legacy:.3f}s, property plan {planned:.3f}s ({legacy / planned:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
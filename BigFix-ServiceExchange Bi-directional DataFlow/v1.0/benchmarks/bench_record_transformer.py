@@ -0,0 +1,105 @@
+"""
+Compare the per-record BigFix to ServiceExchange conversion loop used before BigFixToSXTransformer
+with the compiled transformer, on synthetic BigFix records and the shipped DataFlowsConfig.xml.
+
+Run from the application directory:
+    python benchmarks/bench_record_transformer.py [number of records]
+"""
+import gc
+import os
+import random
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_correlation.record_transformer import BigFixToSXTransformer
+from utils.dataflow_config import DataFlowConfig, BF_TO_SX
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "DataFlowsConfig.xml")
+SETTING_NAMES = ["Status", "Sub-Status", "Category", "Sub-Category", "Company Name", "Class", "Type", "Test", "Owner", "Region", "Patch Window", "Tier"]
+
+
+def legacy_transform(devices, dataflow):
+    """Conversion loop of main.py before the transformer: mappings read from the XML, tags rebuilt per setting."""
+    source_props = list(dataflow.find("sourceadapter/device_properties"))
+    target_props = list(dataflow.find("targetadapter/device_properties"))
+    direct_mapping, setting_mapping = {}, {}
+    for src_prop, tgt_prop in zip(source_props, target_props):
+        if src_prop.tag.lower() == "setting":
+            setting_mapping[src_prop.get("propertyname")] = tgt_prop.get("propertyname")
+        else:
+            direct_mapping[src_prop.get("propertyname")] = tgt_prop.get("propertyname")
+
+    sx_data = []
+    for device in devices:
+        device_data = {}
+        for bf_key, sx_key in direct_mapping.items():
+            value = device.get(bf_key)
+            if value is not None:
+                device_data[sx_key] = value
+
+        client_settings_str = device.get("Client Settings", "")
+        settings_dict = {}
+        if client_settings_str:
+            for setting in client_settings_str.split(","):
+                if "=" in setting:
+                    key, value = setting.split("=", 1)
+                    settings_dict[key.strip()] = value.strip()
+
+        for bf_key, sx_key in setting_mapping.items():
+            if bf_key in settings_dict:
+                device_data[sx_key] = settings_dict[bf_key]
+            custom_tags = []
+            for prop in target_props:
+                if prop.get("type", "general") == "custom":
+                    tag_name = prop.get("propertyname")
+                    tag_value = device_data.pop(tag_name, None)
+                    if tag_value is not None:
+                        custom_tags.append({"tag_name": tag_name, "tag_value": tag_value, "tag_mandatory": False})
+            if custom_tags:
+                device_data["tag"] = {"tag_data": custom_tags}
+        sx_data.append(device_data)
+    return sx_data
+
+
+def make_devices(count):
+    random.seed(1)
+    return [{
+        "ID": str(i),
+        "Computer Name": f"host{i}",
+        "IP Address": f"10.{i % 250}.{i % 13}.{i % 7}",
+        "MAC Address": f"00:11:22:{i % 99:02d}",
+        "Client Settings": ", ".join(f"{name}=v{random.randint(0, 9)}" for name in SETTING_NAMES)
+    } for i in range(count)]
+
+
+def best_of(function, repeat=5):
+    gc.disable()
+    try:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+    finally:
+        gc.enable()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    dataflow = ET.parse(CONFIG_PATH).getroot().find(f".//dataflow[@displayname='{BF_TO_SX}']")
+    transformer = BigFixToSXTransformer.from_config(DataFlowConfig.load(CONFIG_PATH))
+    devices = make_devices(count)
+
+    assert legacy_transform(devices[:1000], dataflow) == [transformer.transform(device) for device in devices[:1000]]
+
+    legacy = best_of(lambda: legacy_transform(devices, dataflow))
+    compiled = best_of(lambda: [transformer.transform(device) for device in devices])
+    print(f"{count} records: legacy loop {legacy:.3f}s, BigFixToSXTransformer {compiled:.3f}s ({legacy / compiled:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
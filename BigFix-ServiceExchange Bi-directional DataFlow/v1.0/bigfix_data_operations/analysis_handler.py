@@ -1,4 +1,6 @@
 import requests
+import hashlib
+import json
 from requests.auth import HTTPBasicAuth
 from datetime import date, datetime
 import xml.etree.ElementTree as ET
@@ -6,13 +8,16 @@ from logger import logger
 from utils.api_operations_template import APIRequest
 
 class BigFixAnalysisHandler:
-    def __init__(self, base_url, username, password, site_name, proxy_url, proxy_username, proxy_password, hash_value, verify):
+    def __init__(self, base_url, username, password, site_name, proxy_url, proxy_username, proxy_password, hash_value, verify, transport="mailbox", cache=None):
         self.base_url = base_url
         self.username = username
         self.password = password
         self.site_name = site_name
         self.hash_value = hash_value
         self.verify = verify
+        self.transport = transport
+        self.site_file_name = f"CMDBData-{hash_value}.csv"
+        self.cache = cache
         self.APIRequestHandler = APIRequest(base_url=base_url, proxy_url=proxy_url, proxy_username=proxy_username, proxy_password=proxy_password)
 
     def get_properties(self, property_names):
@@ -23,12 +28,26 @@ class BigFixAnalysisHandler:
         properties = []
         for index, name in enumerate(property_names):
             name = name.strip()
-            relevance = (
-                f'concatenation "," of tuple string item {index} of tuple string of substrings separated by "," of lines of file whose (name of it starts with "CMDBData-{self.hash_value}") of folder "mailboxsite" of data folder of client | "not set"'
-            )
+            if self.transport == "site_file":
+                # Each line of the site file starts with the computer ID, followed by the property values
+                relevance = (
+                    f'concatenation "," of tuple string item {index + 1} of tuple string of substrings separated by "," of lines whose (it starts with (computer id as string & ",")) of file "{self.site_file_name}" of client folder of current site | "not set"'
+                )
+            else:
+                relevance = (
+                    f'concatenation "," of tuple string item {index} of tuple string of substrings separated by "," of lines of file whose (name of it starts with "CMDBData-{self.hash_value}") of folder "mailboxsite" of data folder of client | "not set"'
+                )
             properties.append({"Name": name, "Relevance": relevance})
         return properties
 
+    def get_analysis_relevance(self):
+        """
+        Return the applicability relevance of the analysis for the configured transport.
+        """
+        if self.transport == "site_file":
+            return f'exists lines whose (it starts with (computer id as string & ",")) of file "{self.site_file_name}" of client folder of current site'
+        return f'exists file whose (name of it starts with "CMDBData-{self.hash_value}") of folder "mailboxsite" of data folder of client'
+
     def generate_analysis_payload(self, name, description, properties):
         """
         Generate XML payload for creating a BigFix analysis.
@@ -42,7 +61,7 @@ class BigFixAnalysisHandler:
     <Analysis>
         <Title>{name}</Title>
         <Description><![CDATA[{description}]]></Description>
-        <Relevance>exists file whose (name of it starts with "CMDBData-{self.hash_value}") of folder "mailboxsite" of data folder of client</Relevance>
+        <Relevance>{self.get_analysis_relevance()}</Relevance>
         <Source>Internal</Source>
         <SourceReleaseDate>{date.today()}</SourceReleaseDate>
         <MIMEField>
@@ -60,6 +79,42 @@ class BigFixAnalysisHandler:
         """
         return analysis_template.strip()
 
+    def analysis_fingerprint(self, name, description, properties):
+        """
+        Return a digest of everything that defines the analysis except its modification time.
+        """
+        definition = [name, description, self.get_analysis_relevance(), [[prop["Name"], prop["Relevance"]] for prop in properties]]
+        return hashlib.sha256(json.dumps(definition, separators=(",", ":")).encode("utf-8")).hexdigest()
+
+    def publish_analysis(self, name, description, properties):
+        """
+        Create or update the analysis only when its property/relevance set changed since the last run.
+        The analysis ID and fingerprint are kept in the cache so unchanged runs make no API calls.
+        Returns the analysis ID, or None if the analysis could not be published.
+        """
+        fingerprint = self.analysis_fingerprint(name, description, properties)
+        state = (self.cache.load_from_cache("analysis_state") or {}) if self.cache is not None else {}
+        analysis_id = state.get("id")
+        if analysis_id and state.get("fingerprint") == fingerprint:
+            logger.info(f"Analysis {analysis_id} is unchanged. Skipping update.")
+            return analysis_id
+
+        payload = self.generate_analysis_payload(name, description, properties)
+        if not (analysis_id and self.put_analysis(analysis_id, payload)):
+            if analysis_id:
+                # The cached ID may be stale, e.g. the analysis was deleted or recreated in the console
+                logger.warning(f"Updating cached analysis {analysis_id} failed. Looking up the analysis ID again.")
+            analysis_id = self.get_analysis_id()
+            if analysis_id:
+                if not self.put_analysis(analysis_id, payload):
+                    analysis_id = None
+            else:
+                analysis_id = self.post_analysis(payload)
+
+        if analysis_id and self.cache is not None:
+            self.cache.save_to_cache("analysis_state", {"id": analysis_id, "fingerprint": fingerprint})
+        return analysis_id
+
     def post_analysis(self, payload):
         """
         Send the API request to create the analysis.
@@ -72,10 +127,17 @@ class BigFixAnalysisHandler:
 
             if response.status_code == 200:
                 logger.info("Analysis created successfully!")
+                try:
+                    return ET.fromstring(response.text).findtext(".//ID")
+                except ET.ParseError as e:
+                    logger.error(f"Error parsing XML: {e}")
+                    return None
             else:
                 logger.error(f"Failed to create analysis. Status Code: {response.status_code}")
+                return None
         except Exception as e:
             logger.error(f"Error occurred while creating analysis: {e}")
+            return None
 
     def put_analysis(self, analysis_id, payload):
         """
@@ -89,10 +151,13 @@ class BigFixAnalysisHandler:
 
             if response.status_code == 200:
                 logger.info("Analysis created successfully!")
+                return True
             else:
                 logger.error(f"Failed to create analysis. Status Code: {response.status_code}")
+                return False
         except Exception as e:
             logger.error(f"Error occurred while creating analysis: {e}")
+            return False
 
     def get_analysis_id(self):
         """
@@ -1,21 +1,36 @@
+import io
 import requests
-import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
 from utils.api_operations_template import APIRequest
+from utils.rate_limiter import RateLimiter
+from utils.shared_snapshot import SharedSnapshot
+from utils import codec
 from logger import logger
 import urllib3
-import json
 
 urllib3.disable_warnings()
 
+# Errors of a single BigFix request: APIRequest wraps HTTP and transport errors in RuntimeError,
+# reading a streamed body raises urllib3 errors and a malformed body raises a SyntaxError subclass
+REQUEST_ERRORS = (RuntimeError, requests.RequestException, urllib3.exceptions.HTTPError, SyntaxError)
+
 class BigFixAPIHandler:
-    def __init__(self, config_path, base_url, username, password, proxy_url, proxy_username, proxy_password, verify, bigfix_properties_sx_to_bf):
+    def __init__(self, config_path, base_url, username, password, proxy_url, proxy_username, proxy_password, verify, bigfix_properties_sx_to_bf, bigfix_properties_bf_to_sx=None, fetch_mode="per_computer", max_in_flight=1, requests_per_second=0, pool_size=10, delta_mode=False, cache=None, snapshot_ttl=0):
         self.config_path = config_path
         self.base_url = base_url
         self.username = username
         self.password = password
         self.verify = verify
         self.properties = bigfix_properties_sx_to_bf
-        self.APIRequestHandler = APIRequest(base_url=base_url, proxy_url=proxy_url, proxy_username=proxy_username, proxy_password=proxy_password)
+        self.properties_bf_to_sx = bigfix_properties_bf_to_sx
+        self.fetch_mode = fetch_mode
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.rate_limiter = RateLimiter.for_host(base_url, requests_per_second)
+        self.delta_mode = delta_mode
+        self.cache = cache
+        # Dataflows running at the same time share one BigFix fetch
+        self.snapshot = SharedSnapshot(self.load_computer_data, ttl=snapshot_ttl)
+        self.APIRequestHandler = APIRequest(base_url=base_url, proxy_url=proxy_url, proxy_username=proxy_username, proxy_password=proxy_password, pool_size=pool_size)
 
     def get_property_value(self, api_data, property_path):
         """
@@ -28,10 +43,10 @@ class BigFixAPIHandler:
         try:
             for key in keys:
                 if isinstance(value, str):  # Convert JSON string to dictionary or list
-                    try:
-                        value = json.loads(value)
-                    except json.JSONDecodeError:
+                    parsed = codec.loads_nested(value)
+                    if parsed is codec.NOT_JSON:
                         return value  # Return as-is if not JSON
+                    value = parsed
                 if isinstance(value, list):  # If it's a list, pick the first element
                     value = value[0] if value else None
                 if value is None:
@@ -45,35 +60,161 @@ class BigFixAPIHandler:
             return None
 
     def get_computer_data(self):
+        """
+        Return detailed computer data from BigFix. Concurrent callers share a single fetch,
+        and a fetched snapshot is reused for snapshot_ttl seconds.
+        """
+        computer_details = self.snapshot.get()
+        return list(computer_details) if computer_details is not None else None
+
+    def load_computer_data(self):
         """Fetch detailed computer data from BigFix, mapping backend fields to display names."""
         try:
-            computer_ids = self.get_computer_ids()
-            logger.info(f"Fetched {len(computer_ids)} computer IDs from BigFix.")
-            computer_details = []
+            if self.delta_mode and self.cache is not None:
+                return self.get_computer_data_delta()
 
-            for computer_id in computer_ids:
-                details = self.get_computer_details(computer_id)
-                print(details)                
+            computer_details = self.fetch_computers()
+            for details in computer_details:
+                print(details)
                 logger.info(details)
-                computer_details.append(details)
             print(computer_details)
             return computer_details
         except Exception as e:
             logger.error(f"Error fetching BigFix computer data: {e}")
             return None
-    
+
+    def fetch_computers(self, computer_ids=None):
+        """
+        Fetch details for the given computer IDs, or for all computers when no IDs are given,
+        using the configured fetch mode.
+        """
+        if self.fetch_mode == "bulk":
+            try:
+                computer_details = self.get_computer_data_bulk(computer_ids)
+                logger.info(f"Fetched {len(computer_details)} computers from BigFix in bulk.")
+                return computer_details
+            except Exception as e:
+                logger.error(f"Bulk fetch from BigFix failed, falling back to per-computer requests: {e}")
+
+        if computer_ids is None:
+            computer_ids = self.get_computer_ids()
+            logger.info(f"Fetched {len(computer_ids)} computer IDs from BigFix.")
+        return self.get_computers_details(computer_ids)
+
+    def get_computer_data_delta(self):
+        """
+        Fetch computer data, re-fetching details only for computers whose last report time
+        changed since the previous run. Unchanged computers are served from the local cache.
+        """
+        report_times = self.get_computer_report_times()
+        property_names = self.get_property_names()
+
+        stored = self.cache.get_records("bf_snapshot")
+        legacy_snapshot = self.cache.pop_from_cache("bf_snapshot")
+        if legacy_snapshot:
+            # Snapshot written as a single cache key before records were stored individually
+            stored = legacy_snapshot.get("computers", {})
+            self.cache.save_to_cache("bf_snapshot_properties", legacy_snapshot.get("properties"))
+            self.cache.upsert_records("bf_snapshot", stored)
+        # A different property set invalidates every stored record
+        known = stored if self.cache.load_from_cache("bf_snapshot_properties") == property_names else {}
+
+        # Computers without a report time have no usable watermark and are always fetched
+        changed_ids = [computer_id for computer_id, last_report_time in report_times
+                       if last_report_time is None or known.get(computer_id, {}).get("last_report_time") != last_report_time]
+        logger.info(f"{len(changed_ids)} of {len(report_times)} BigFix computers changed since the last run.")
+
+        fetched = {}
+        if changed_ids:
+            for details in self.fetch_computers(changed_ids):
+                if details.get("ID"):
+                    fetched[details["ID"]] = details
+
+        updates = {}
+        current_ids = set()
+        computer_details = []
+        for computer_id, last_report_time in report_times:
+            current_ids.add(computer_id)
+            if computer_id in fetched:
+                updates[computer_id] = {"last_report_time": last_report_time, "details": fetched[computer_id]}
+                computer_details.append(fetched[computer_id])
+            elif computer_id in known:
+                # Fetch failed or unchanged: keep the stored record and its watermark
+                computer_details.append(known[computer_id]["details"])
+            else:
+                logger.warning(f"No details available for computer ID {computer_id}.")
+
+        # Only fetched computers are written; records of removed computers or of an outdated property set are dropped
+        self.cache.save_to_cache("bf_snapshot_properties", property_names)
+        self.cache.upsert_records("bf_snapshot", updates)
+        kept_ids = current_ids & known.keys()
+        self.cache.delete_records("bf_snapshot", [computer_id for computer_id in stored if computer_id not in kept_ids and computer_id not in updates])
+        return computer_details
+
+    def get_property_names(self):
+        """Collect the BigFix property names required by the configured dataflows."""
+        property_names = []
+        for properties in (self.properties, self.properties_bf_to_sx):
+            for prop_info in (properties or {}).values():
+                propertyname = prop_info.get("propertyname")
+                if propertyname and propertyname not in property_names:
+                    property_names.append(propertyname)
+
+        # Settings of the BigFix to SX dataflow are read from the "Client Settings" property
+        if self.properties_bf_to_sx and "Client Settings" not in property_names:
+            property_names.append("Client Settings")
+        return property_names
+
+    def build_bulk_relevance(self, property_names, computer_ids=None):
+        """
+        Build a single session relevance query returning (computer id, property name, value)
+        tuples for every requested property of every computer, or of the given computer IDs.
+        """
+        computer_filter = ""
+        result_filter = ""
+        if computer_ids is not None:
+            id_set = ";".join(str(int(computer_id)) for computer_id in computer_ids)
+            computer_filter = f" whose (id of it is contained by set of ({id_set}))"
+            result_filter = f" whose (id of computer of it is contained by set of ({id_set}))"
+
+        # Every computer yields its ID, so computers without any reported value are still returned
+        relevance = f'(id of it, "ID", id of it as string) of bes computers{computer_filter}'
+        names = [name for name in property_names if name != "ID"]
+        if names:
+            name_filter = " or ".join(f'name of it = "{self.escape_relevance_string(name)}"' for name in names)
+            relevance += f' ; ((id of computer of it, name of property of it, values of it) of results{result_filter} of bes properties whose ({name_filter}))'
+        return relevance
+
+    @staticmethod
+    def escape_relevance_string(value):
+        """Escape a value for use inside a relevance string literal."""
+        return value.replace("%", "%25").replace('"', "%22")
+
+    def get_computer_data_bulk(self, computer_ids=None):
+        """Fetch all configured properties of all (or the given) computers with one /api/query request."""
+        endpoint = "/api/query"
+        property_names = self.get_property_names()
+        # The relevance is sent as form data so long computer ID lists do not exceed URL limits
+        data = {"relevance": self.build_bulk_relevance(property_names, computer_ids)}
+        logger.info(f"Fetching properties {property_names} for {'all' if computer_ids is None else len(computer_ids)} computers from BigFix: {endpoint}")
+        return self.request_xml(self.parse_bulk_query_from_xml, method="POST", endpoint=endpoint, data=data)
+
     def get_computer_ids(self):
         """Fetch all computer IDs from BigFix."""
         endpoint = "/api/computers"
         try:
             logger.info(f"Fetching computer IDs from BigFix: {endpoint}")
-            response = self.APIRequestHandler.request(method="GET", endpoint=endpoint, username=self.username, password=self.password, verify=self.verify)
-            response.raise_for_status()
-            return self.parse_ids_from_xml(response.text)
-        except requests.RequestException as e:
+            return self.request_xml(self.parse_ids_from_xml, method="GET", endpoint=endpoint)
+        except REQUEST_ERRORS as e:
             logger.error(f"Error fetching computer IDs from BigFix: {e}")
             return []
         
+    def get_computer_report_times(self):
+        """Fetch all computer IDs from BigFix together with their last report time."""
+        endpoint = "/api/computers"
+        logger.info(f"Fetching computer IDs and report times from BigFix: {endpoint}")
+        return self.request_xml(self.parse_report_times_from_xml, method="GET", endpoint=endpoint)
+
     def validate_connection(self):
         """Validating Connection to BigFix."""
         endpoint = "/api/query"
@@ -87,30 +228,86 @@ class BigFixAPIHandler:
             logger.error(f"Error fetching computer IDs from BigFix: {e}")
             return []
 
+    def get_computers_details(self, computer_ids):
+        """
+        Fetch detailed information for many computers, keeping at most max_in_flight
+        requests open at once. Results are returned in the order of computer_ids;
+        computers whose details could not be fetched are left out.
+        """
+        if self.max_in_flight <= 1 or len(computer_ids) <= 1:
+            computer_details = [self.get_computer_details(computer_id) for computer_id in computer_ids]
+        else:
+            logger.info(f"Fetching details for {len(computer_ids)} computers with {self.max_in_flight} concurrent requests.")
+            with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="BigFixFetch") as executor:
+                computer_details = list(executor.map(self.get_computer_details, computer_ids))
+        return [details for details in computer_details if details is not None]
+
     def get_computer_details(self, computer_id):
-        """Fetch detailed information for a single computer by ID."""
+        """Fetch detailed information for a single computer by ID. Returns None if the request failed."""
         endpoint = f"/api/computer/{computer_id}"
         try:
+            self.rate_limiter.acquire()
             logger.info(f"Fetching details for computer ID: {computer_id}")
-            response = self.APIRequestHandler.request(method="GET", endpoint=endpoint, username=self.username, password=self.password, verify=self.verify)
-            response.raise_for_status()
-            return self.parse_details_from_xml(response.text)
-        except requests.RequestException as e:
+            return self.request_xml(self.parse_details_from_xml, method="GET", endpoint=endpoint)
+        except REQUEST_ERRORS as e:
             logger.error(f"Error fetching details for computer ID {computer_id}: {e}")
-            return {prop: None for prop in self.properties}
+            return None
+
+    def request_xml(self, parse, method, endpoint, **kwargs):
+        """
+        Send a request and parse its XML response with parse while the body is still downloading,
+        so large responses are never held in memory as a whole.
+        """
+        response = self.APIRequestHandler.request(method=method, endpoint=endpoint, username=self.username, password=self.password, verify=self.verify, stream=True, **kwargs)
+        with response:
+            # Let urllib3 undo gzip/deflate transfer encoding while streaming
+            response.raw.decode_content = True
+            return parse(response.raw)
+
+    @staticmethod
+    def iter_xml_elements(xml_data, tags):
+        """
+        Incrementally parse XML and yield every completed element whose tag is in tags.
+        Yielded elements and other completed children of the root are detached and cleared once
+        the caller moves on, so memory stays bounded by a single record however large the document is.
+
+        :param xml_data: UTF-8 XML text, bytes or a binary file-like object such as a streamed response body.
+        :param tags: Tags of the elements to yield.
+        """
+        if isinstance(xml_data, str):
+            xml_data = io.BytesIO(xml_data.encode("utf-8"))
+        elif isinstance(xml_data, bytes):
+            xml_data = io.BytesIO(xml_data)
+
+        parents = []
+        for event, element in codec.iterparse(xml_data, events=("start", "end")):
+            if event == "start":
+                parents.append(element)
+                continue
+            parents.pop()
+            if element.tag in tags:
+                yield element
+            elif len(parents) != 1:
+                continue
+            if parents:
+                parents[-1].remove(element)
+            element.clear()
 
     def parse_ids_from_xml(self, xml_data):
         """Parse computer IDs from BigFix XML response."""
-        root = ET.fromstring(xml_data)
-        return [comp_id.text for comp_id in root.findall(".//ID")]
+        return [computer.findtext("ID") for computer in self.iter_xml_elements(xml_data, {"Computer"})]
+
+    def parse_report_times_from_xml(self, xml_data):
+        """Parse (computer ID, last report time) pairs from BigFix XML response."""
+        # /api/computers returns the report time as a <LastReportTime> child element of <Computer>
+        return [(computer.findtext("ID"), computer.findtext("LastReportTime") or None) for computer in self.iter_xml_elements(xml_data, {"Computer"})]
 
     def parse_details_from_xml(self, xml_data):
         """Parse detailed information of a computer from BigFix XML response."""
-        root = ET.fromstring(xml_data)
         parsed_details = {}
 
         # Gather all properties
-        for prop in root.findall(".//Property"):
+        for prop in self.iter_xml_elements(xml_data, {"Property"}):
             name = prop.get("Name")
             value = prop.text
             if name in parsed_details:
@@ -126,4 +323,31 @@ class BigFixAPIHandler:
             if isinstance(value, list):
                 parsed_details[key] = ", ".join(value)
 
-        return parsed_details
\ No newline at end of file
+        return parsed_details
+
+    def parse_bulk_query_from_xml(self, xml_data):
+        """Parse a bulk relevance query response into one details dictionary per computer."""
+        computers = {}
+        for element in self.iter_xml_elements(xml_data, {"Tuple", "Error"}):
+            if element.tag == "Error":
+                raise ValueError(f"BigFix relevance query failed: {element.text}")
+            answers = [answer.text or "" for answer in element.findall("Answer")]
+            if len(answers) != 3:
+                continue
+            computer_id, name, value = answers
+            parsed_details = computers.setdefault(computer_id, {})
+            if name in parsed_details:
+                if isinstance(parsed_details[name], list):
+                    parsed_details[name].append(value)
+                else:
+                    parsed_details[name] = [parsed_details[name], value]
+            else:
+                parsed_details[name] = value
+
+        # Convert properties with multiple values into comma-separated strings
+        for parsed_details in computers.values():
+            for key, value in parsed_details.items():
+                if isinstance(value, list):
+                    parsed_details[key] = ", ".join(value)
+
+        return list(computers.values())
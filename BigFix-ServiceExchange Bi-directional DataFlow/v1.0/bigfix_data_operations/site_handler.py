@@ -4,12 +4,13 @@ from logger import logger
 from utils.api_operations_template import APIRequest
 
 class BigFixSiteHandler:
-    def __init__(self, base_url, username, password, proxy_url, proxy_username, proxy_password, site_name, verify):
+    def __init__(self, base_url, username, password, proxy_url, proxy_username, proxy_password, site_name, verify, cache=None):
         self.base_url = base_url
         self.username = username
         self.password = password
         self.site_name = site_name
         self.verify = verify
+        self.cache = cache
         self.APIRequestHandler = APIRequest(base_url=base_url, proxy_url=proxy_url, proxy_username=proxy_username, proxy_password=proxy_password)
 
     def get_site(self):
@@ -29,4 +30,62 @@ class BigFixSiteHandler:
                 return False
         except Exception as e:
             logger.error(f"Error occurred while retrieving site: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    def upload_file(self, file_name, content):
+        """
+        Upload a file to the custom site, replacing a site file of the same name.
+        """
+        endpoint = f"/api/site/custom/{self.site_name}/files"
+        try:
+            response = self.APIRequestHandler.request(method="POST", endpoint=endpoint, username=self.username, password=self.password, files={"file": (file_name, content)}, verify=self.verify)
+            logger.info(f"Uploaded '{file_name}' ({len(content)} bytes) to custom site '{self.site_name}'.")
+            return True
+        except Exception as e:
+            logger.error(f"Error occurred while uploading '{file_name}' to site '{self.site_name}': {e}")
+            return False
+
+    def has_rows(self, file_name):
+        """
+        Return True if rows of file_name from earlier runs are cached, so a run can push only changed rows.
+        """
+        rows = self.cache.load_from_cache("site_file_rows") if self.cache is not None else None
+        return bool(rows) and rows.get("file_name") == file_name and bool(rows.get("computers"))
+
+    def push_rows(self, payloads, file_name, computer_ids=None):
+        """
+        Publish per-computer payloads as one site file with a "computer id,payload" line per computer,
+        instead of one mailbox file per computer. Rows of earlier runs are kept in the cache so the file
+        always covers every correlated computer; it is uploaded only when a row changed.
+
+        :param payloads: List of (computer_id, payload) pairs that changed in this run.
+        :param file_name: Name of the site file.
+        :param computer_ids: Optional IDs of all current BigFix computers; rows of other computers are dropped.
+        :return: Dictionary mapping each computer ID to "pushed", "unchanged" or "failed".
+        """
+        rows = (self.cache.load_from_cache("site_file_rows") or {}) if self.cache is not None else {}
+        if rows.get("file_name") != file_name:
+            rows = {"file_name": file_name, "computers": {}}
+        computers = dict(rows["computers"])
+
+        results = {}
+        for computer_id, payload in payloads:
+            results[computer_id] = "unchanged" if computers.get(str(computer_id)) == payload else "pushed"
+            computers[str(computer_id)] = payload
+        if computer_ids is not None:
+            current_ids = {str(computer_id) for computer_id in computer_ids}
+            computers = {computer_id: payload for computer_id, payload in computers.items() if computer_id in current_ids}
+
+        if computers == rows["computers"]:
+            logger.info(f"Site file '{file_name}' is unchanged. Skipping upload.")
+            return results
+
+        # Sorted by computer ID so identical data always produces an identical file
+        lines = [f"{computer_id},{computers[computer_id]}" for computer_id in sorted(computers, key=lambda computer_id: (len(computer_id), computer_id))]
+        if not self.upload_file(file_name, ("\n".join(lines) + "\n").encode("utf-8")):
+            return {computer_id: "failed" for computer_id in results}
+
+        if self.cache is not None:
+            self.cache.save_to_cache("site_file_rows", {"file_name": file_name, "computers": computers})
+        logger.info(f"Site file push completed: {len(computers)} computers, {list(results.values()).count('pushed')} changed rows.")
+        return results
\ No newline at end of file
@@ -1,10 +1,13 @@
-import requests
+import threading
+import time
+from utils.api_operations_template import APIRequest
 
 class APIClient:
     """
     A unified API client that handles OAuth authentication and API requests.
+    Access tokens and the user payloads derived from them are cached until shortly before the token expires.
     """
-    def __init__(self, client_id, client_secret, token_url, base_url, username, password):
+    def __init__(self, client_id, client_secret, token_url, base_url, username, password, proxy_url=None, proxy_username=None, proxy_password=None, pool_size=10, expiry_margin=60, default_expires_in=300):
         self.client_id = client_id
         self.client_secret = client_secret
         self.token_url = token_url
@@ -12,6 +15,28 @@ class APIClient:
         self.username = username
         self.password = password
         self.access_token = None
+        self.refresh_token = None
+        self.token_expires_at = 0
+        # Tokens are renewed expiry_margin seconds early; default_expires_in applies when the server sends no expiry
+        self.expiry_margin = expiry_margin
+        self.default_expires_in = default_expires_in
+        self.payload_cache = {}
+        self.lock = threading.RLock()
+        self.TokenRequestHandler = APIRequest(base_url=token_url, proxy_url=proxy_url, proxy_username=proxy_username, proxy_password=proxy_password, pool_size=pool_size)
+        self.APIRequestHandler = APIRequest(base_url=base_url, proxy_url=proxy_url, proxy_username=proxy_username, proxy_password=proxy_password, pool_size=pool_size)
+
+    def request_token(self, payload):
+        """
+        Request a token from the token endpoint and store the access token, refresh token and expiry.
+        """
+        response = self.TokenRequestHandler.request(method="POST", data=payload, username=self.client_id, password=self.client_secret)
+        token_info = response.json()
+        self.access_token = token_info.get("access_token")
+        self.refresh_token = token_info.get("refresh_token", self.refresh_token)
+        expires_in = float(token_info.get("expires_in") or self.default_expires_in)
+        self.token_expires_at = time.monotonic() + max(0, expires_in - self.expiry_margin)
+        self.payload_cache.clear()
+        return self.access_token
 
     def authenticate(self):
         """
@@ -22,37 +47,83 @@ class APIClient:
             "username": self.username,
             "password": self.password
         }
-        try:
-            response = requests.post(self.token_url, data=payload, auth=(self.client_id, self.client_secret))
-            response.raise_for_status()  # Raise an error for bad responses
-            token_info = response.json()
-            self.access_token = token_info.get("access_token")
-            return self.access_token
-        except requests.exceptions.RequestException as e:
-            print(f"Error getting OAuth token: {e}")
-            return None
+        with self.lock:
+            try:
+                return self.request_token(payload)
+            except (RuntimeError, ValueError) as e:
+                print(f"Error getting OAuth token: {e}")
+                self.invalidate_token()
+                return None
 
-    def make_request(self, endpoint):
+    def refresh(self):
+        """
+        Renews the access token with the refresh token, falling back to the password grant.
+        """
+        with self.lock:
+            if self.refresh_token:
+                payload = {
+                    "grant_type": "refresh_token",
+                    "refresh_token": self.refresh_token
+                }
+                try:
+                    return self.request_token(payload)
+                except (RuntimeError, ValueError) as e:
+                    print(f"Error refreshing OAuth token: {e}. Authenticating again...")
+                    self.refresh_token = None
+            return self.authenticate()
+
+    def invalidate_token(self):
         """
-        Makes an authenticated GET request. If no token is available, it will authenticate first.
+        Drops the cached access token and the payloads derived from it.
         """
-        if not self.access_token:
+        with self.lock:
+            self.access_token = None
+            self.token_expires_at = 0
+            self.payload_cache.clear()
+
+    def get_access_token(self):
+        """
+        Returns a valid access token, refreshing or re-authenticating only when the cached token is about to expire.
+        """
+        with self.lock:
+            if self.access_token and time.monotonic() < self.token_expires_at:
+                return self.access_token
+            if self.access_token or self.refresh_token:
+                print("Access token expired. Refreshing...")
+                return self.refresh()
             print("No access token found. Authenticating...")
-            self.authenticate()
+            return self.authenticate()
 
-        if not self.access_token:
-            print("Authentication failed. Cannot make request.")
-            return None
+    def make_request(self, endpoint):
+        """
+        Makes an authenticated GET request and returns the user payload.
+        The payload is cached with the token; a 401 response renews the token and retries once.
+        """
+        with self.lock:
+            access_token = self.get_access_token()
+            if not access_token:
+                print("Authentication failed. Cannot make request.")
+                return None
+            if endpoint in self.payload_cache:
+                return self.payload_cache[endpoint]
 
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded',
-            'Authorization': f'Bearer {self.access_token}',
-        }
-        url = f"{self.base_url}/{endpoint}"
-        try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            return response.json().get("x-user-payload")
-        except requests.exceptions.RequestException as e:
-            print(f"Error making API request: {e}")
-            return None
\ No newline at end of file
+            for attempt in range(2):
+                headers = {
+                    'Content-Type': 'application/x-www-form-urlencoded',
+                    'Authorization': f'Bearer {access_token}',
+                }
+                try:
+                    response = self.APIRequestHandler.request(method="GET", endpoint=f"/{endpoint}", headers=headers)
+                    user_payload = response.json().get("x-user-payload")
+                    self.payload_cache[endpoint] = user_payload
+                    return user_payload
+                except (RuntimeError, ValueError) as e:
+                    response = getattr(e.__cause__, "response", None)
+                    if attempt == 0 and response is not None and response.status_code == 401:
+                        print("Access token rejected. Authenticating again...")
+                        self.invalidate_token()
+                        access_token = self.refresh()
+                        if access_token:
+                            continue
+                    print(f"Error making API request: {e}")
+                    return None
@@ -1,5 +1,4 @@
-import xml.etree.ElementTree as ET
-import json
+from utils import codec
 
 class DataCorrelation:
     """Class to handle data correlation between BigFix and SX data."""
@@ -14,29 +13,51 @@ class DataCorrelation:
         return []
     
     @staticmethod
-    def parse_identity_properties(xml_file):
+    def build_weighted_index(sx_data, sx_identities):
         """
-        Parse identity properties from the dataflowconfig.xml file.
-        Extracts properties used for correlation with display names.
+        Index SX records per identity property: one {normalized value: [record positions]} map per property.
+        Multi-valued properties (e.g. comma separated IP or MAC lists) are indexed value by value.
         """
-        tree = ET.parse(xml_file)
-        root = tree.getroot()
-        
-        identity_properties = {"bigfix": {}, "sx": {}}
-
-        # Extract identity properties from the ServiceExchange adapter
-        sx_adapter = root.find(".//sourceadapter")
-        if sx_adapter is not None:
-            for prop in sx_adapter.findall(".//identityproperty"):
-                identity_properties["sx"][prop.attrib["displayname"]] = prop.attrib["propertyname"]
-
-        # Extract identity properties from the BigFix adapter
-        bf_adapter = root.find(".//targetadapter")
-        if bf_adapter is not None:
-            for prop in bf_adapter.findall(".//identityproperty"):
-                identity_properties["bigfix"][prop.attrib["displayname"]] = prop.attrib["propertyname"]
-
-        return identity_properties
+        field_indexes = [{} for _ in sx_identities]
+        for position, sx_item in enumerate(sx_data):
+            for field, sx_identity in enumerate(sx_identities):
+                sx_value = DataCorrelation.get_property_value(sx_item, sx_identity)
+                if not sx_value:
+                    continue
+                for value in DataCorrelation.normalize_ip_addresses(str(sx_value).lower()):
+                    positions = field_indexes[field].setdefault(value, [])
+                    if not positions or positions[-1] != position:
+                        positions.append(position)
+        return field_indexes
+
+    @staticmethod
+    def match_weighted(bf_item, bigfix_identities, field_indexes, field_weights, minimum_confidence):
+        """
+        Score SX candidates for a BigFix record by the summed weights of the identity properties they share.
+        Returns the position of the best candidate reaching minimum_confidence, or None.
+        Ties are broken by the number of matching properties, then by SX record order.
+        """
+        scores = {}
+        for field, bf_identity in enumerate(bigfix_identities):
+            bf_value = DataCorrelation.get_property_value(bf_item, bf_identity)
+            if not bf_value:
+                continue
+            candidates = set()
+            for value in DataCorrelation.normalize_ip_addresses(str(bf_value).lower()):
+                candidates.update(field_indexes[field].get(value, ()))
+            for position in candidates:
+                score, matched_fields = scores.get(position, (0, 0))
+                scores[position] = (score + field_weights[field], matched_fields + 1)
+
+        ranked = sorted(
+            ((score, matched_fields, position) for position, (score, matched_fields) in scores.items() if score >= minimum_confidence),
+            key=lambda candidate: (-candidate[0], -candidate[1], candidate[2])
+        )
+        if not ranked:
+            return None
+        if len(ranked) > 1 and ranked[0][:2] == ranked[1][:2]:
+            print(f"Ambiguous match with score {ranked[0][0]}; using the first SX record in order.")  # Debug print
+        return ranked[0][2]
     
     @staticmethod
     # Function to get nested property values
@@ -46,10 +67,10 @@ class DataCorrelation:
 
         for key in keys:
             if isinstance(value, str):
-                try:
-                    value = json.loads(value)
-                except json.JSONDecodeError:
+                parsed = codec.loads_nested(value)
+                if parsed is codec.NOT_JSON:
                     return value
+                value = parsed
 
             if isinstance(value, list):
                 value = next((item.get(key, None) for item in value if isinstance(item, dict)), None)
@@ -63,7 +84,15 @@ class DataCorrelation:
     
     @staticmethod
     # Function to correlate BigFix and SX data
-    def correlate(bigfix_data, sx_data, bigfix_properties, sx_properties, identity_properties):
+    def correlate(bigfix_data, sx_data, bigfix_properties, sx_properties, identity_properties, identity_weights=None, minimum_confidence=0, default_weight=None):
+        """
+        Correlate BigFix and SX records on their identity properties.
+
+        Without identity_weights the first SX record sharing any identity value is used.
+        With identity_weights candidates are scored by the summed weights of matching identity
+        properties and the best one reaching minimum_confidence is used. Properties without a
+        weight attribute on either side count default_weight, or minimum_confidence if it is None.
+        """
         correlated_data = []
         sx_data_map = {}
 
@@ -95,6 +124,27 @@ class DataCorrelation:
                 print(f"Storing SX Identity Key: {sx_identity_values}")  # Debug print
                 sx_data_map[frozenset(sx_identity_values)] = sx_item  # Store SX items using tuple keys
 
+        # Inverted index: identity value -> position of the first SX identity key containing it.
+        # Picking the lowest position among a BigFix item's values reproduces the first-match scan.
+        sx_identity_keys = list(sx_data_map.keys())
+        sx_value_index = {}
+        for position, sx_identity_values in enumerate(sx_identity_keys):
+            for value in sx_identity_values:
+                sx_value_index.setdefault(value, position)
+
+        if identity_weights is not None:
+            # Weight of each identity pair, taken from the SX side and falling back to the BigFix side
+            field_weights = []
+            for bf_identity, sx_identity in zip(bigfix_identities, sx_identities):
+                weight = identity_weights["sx"].get(sx_identity)
+                if weight is None:
+                    weight = identity_weights["bigfix"].get(bf_identity)
+                if weight is None:
+                    weight = default_weight if default_weight is not None else minimum_confidence
+                field_weights.append(weight)
+            print(f"Identity Weights: {field_weights}, Minimum Confidence: {minimum_confidence}")
+            field_indexes = DataCorrelation.build_weighted_index(sx_data, sx_identities)
+
         # Correlate BigFix data
         for bf_item in bigfix_data:
             correlated_item = {}
@@ -111,13 +161,20 @@ class DataCorrelation:
 
             print(f"Checking BigFix Identity Key: {bf_identity_values}")  # Debug print
 
-            # Check for any matching values in SX identity sets
             matched_sx_item = None
-            for sx_identity_values in sx_data_map.keys():
-                if bf_identity_values & sx_identity_values:  # Check intersection
+            if identity_weights is not None:
+                # Pick the highest scoring SX record
+                position = DataCorrelation.match_weighted(bf_item, bigfix_identities, field_indexes, field_weights, minimum_confidence)
+                if position is not None:
+                    matched_sx_item = sx_data[position]
+                    print(f"Match Found! {bf_identity_values} <=> SX record {position}")  # Debug print
+            else:
+                # Look up the first SX identity set sharing any value with the BigFix item
+                positions = [sx_value_index[value] for value in bf_identity_values if value in sx_value_index]
+                if positions:
+                    sx_identity_values = sx_identity_keys[min(positions)]
                     matched_sx_item = sx_data_map[sx_identity_values]
                     print(f"Match Found! {bf_identity_values} <=> {sx_identity_values}")  # Debug print
-                    break  # Stop at the first match
 
             if matched_sx_item:
                 # Add dynamically defined BigFix properties using display names
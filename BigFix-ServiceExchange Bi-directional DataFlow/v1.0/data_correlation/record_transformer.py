@@ -0,0 +1,73 @@
+class BigFixToSXTransformer:
+    """
+    Converts BigFix computer records into ServiceExchange CI records in a single pass.
+    The field list is compiled once from the dataflow definition, so transforming a record
+    does not look at the configuration again.
+    """
+    def __init__(self, direct_mapping, setting_mapping, custom_tags=()):
+        """
+        :param direct_mapping: {BigFix property name: SX property name} for <property> and <identityproperty>.
+        :param setting_mapping: {client setting name: SX property name} for <setting>, read from "Client Settings".
+        :param custom_tags: SX property names sent as custom tags instead of plain fields.
+        """
+        self.direct_fields = tuple(direct_mapping.items())
+        self.setting_fields = tuple(setting_mapping.items())
+        self.setting_names = frozenset(setting_mapping)
+        self.custom_tags = tuple(custom_tags)
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Compile the transformer of the BigFix to ServiceExchange dataflow, or return None if it has no mappings.
+        """
+        if config.bf_to_sx_direct_mapping is None:
+            return None
+        return cls(config.bf_to_sx_direct_mapping, config.bf_to_sx_setting_mapping, config.bf_to_sx_custom_tags)
+
+    def parse_client_settings(self, client_settings):
+        """
+        Return the mapped settings of a "name=value, name=value" client settings string.
+        Later occurrences of a setting override earlier ones.
+        """
+        settings = {}
+        setting_names = self.setting_names
+        for setting in client_settings.split(","):
+            name, separator, value = setting.partition("=")
+            if separator:
+                name = name.strip()
+                if name in setting_names:
+                    settings[name] = value.strip()
+        return settings
+
+    def transform(self, device):
+        """
+        Build the SX record of one BigFix device: direct properties, then client settings, then custom tags.
+        """
+        device_data = {}
+        for bf_key, sx_key in self.direct_fields:
+            value = device.get(bf_key)
+            if value is not None:
+                device_data[sx_key] = value
+
+        if self.setting_fields:
+            client_settings = device.get("Client Settings")
+            if client_settings:
+                settings = self.parse_client_settings(client_settings)
+                if settings:
+                    for bf_key, sx_key in self.setting_fields:
+                        if bf_key in settings:
+                            device_data[sx_key] = settings[bf_key]
+
+        # Custom fields are sent in tag format
+        custom_tags = []
+        for tag_name in self.custom_tags:
+            tag_value = device_data.pop(tag_name, None)
+            if tag_value is not None:
+                custom_tags.append({
+                    "tag_name": tag_name,
+                    "tag_value": tag_value,
+                    "tag_mandatory": False
+                })
+        if custom_tags:
+            device_data["tag"] = {"tag_data": custom_tags}
+        return device_data
@@ -0,0 +1,85 @@
+import os
+import threading
+from logger import logger
+from main import load_context, run_dataflows
+from utils.api_operations_template import APIRequest
+
+
+class DataFlowEngine:
+    """
+    Resident engine used by the service to run scheduled dataflows.
+    Parsed configuration, credentials, API handlers with their pooled sessions and the cache
+    are kept between runs and rebuilt only when DataFlowsConfig.xml changes.
+    """
+    def __init__(self, config_path):
+        self.config_path = config_path
+        self.context = None
+        self.config_mtime = None
+        self.active_runs = {}
+        self.lock = threading.Lock()
+
+    def acquire_context(self):
+        """
+        Return the current context for a new run, loading it first if the configuration changed.
+        Returns None if the context could not be loaded.
+        """
+        with self.lock:
+            config_mtime = os.path.getmtime(self.config_path)
+            if self.context is not None and config_mtime != self.config_mtime:
+                logger.info("Configuration file changed. Reloading dataflow engine.")
+                self.retire_context(self.context)
+                self.context = None
+
+            if self.context is None:
+                try:
+                    self.context = load_context(self.config_path)
+                except SystemExit:
+                    self.context = None
+                if self.context is None:
+                    logger.error("Dataflow engine could not be initialized. Retrying on the next run.")
+                    return None
+                # Loading may write the configuration (e.g. a newly generated CMDB hash)
+                self.config_mtime = os.path.getmtime(self.config_path)
+                self.active_runs[id(self.context)] = 0
+
+            self.active_runs[id(self.context)] += 1
+            return self.context
+
+    def release_context(self, context):
+        """
+        Persist the cache after a run and close contexts that were replaced while in use.
+        """
+        context.cache.flush()
+        with self.lock:
+            self.active_runs[id(context)] -= 1
+            if context is not self.context:
+                self.retire_context(context)
+
+    def retire_context(self, context):
+        # Called with the lock held; the context is closed once its last run has finished
+        if self.active_runs.get(id(context)):
+            return
+        self.active_runs.pop(id(context), None)
+        context.cache.close()
+
+    def run(self, dataflow_filter=None):
+        """
+        Run the configured dataflows, or only dataflow_filter, with the resident context.
+        """
+        context = self.acquire_context()
+        if context is None:
+            return
+        try:
+            run_dataflows(context, dataflow_filter)
+        finally:
+            self.release_context(context)
+
+    def close(self):
+        """
+        Close the cache and all pooled sessions, e.g. when the service stops.
+        """
+        with self.lock:
+            if self.context is not None:
+                self.retire_context(self.context)
+                self.context = None
+        APIRequest.close_sessions()
@@ -2,7 +2,7 @@ import logging
 import os
 from datetime import datetime, timedelta
 import sys
-import xml.etree.ElementTree as ET
+from utils.dataflow_config import DataFlowConfig
 
 class LogConfigManager:
     def __init__(self, retention_days=10, log_level="INFO", log_folder="logs"):
@@ -60,9 +60,8 @@ else:
     # If run as a script
     base_dir = os.path.dirname(os.path.abspath(__file__))
 config_path = os.path.join(base_dir, "DataFlowsConfig.xml")
-tree = ET.parse(config_path)
-root = tree.getroot()
-SETTINGS = {setting.get('key'): setting.get('value') for setting in root.findall(".//settings/setting")}
+# The parsed configuration is shared with main.py and the service instead of being parsed again
+SETTINGS = DataFlowConfig.load(config_path).settings
 
 # Retrieve settings for logging
 retention_days = int(SETTINGS["log_retention"])
@@ -1,91 +1,168 @@
-import requests
-from requests.auth import HTTPBasicAuth
+import hashlib
 import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
 from logger import logger
+from utils.api_operations_template import APIRequest
 
 class MailboxManager:
-    def __init__(self, base_url, username, password, hash_value):
+    def __init__(self, base_url, username, password, hash_value, proxy_url=None, proxy_username=None, proxy_password=None, verify=False, pool_size=10, cache=None):
         self.base_url = base_url
-        self.auth = HTTPBasicAuth(username, password)
+        self.username = username
+        self.password = password
         self.hash_value = hash_value
+        self.verify = verify
+        self.cache = cache
+        self.APIRequestHandler = APIRequest(base_url=base_url, proxy_url=proxy_url, proxy_username=proxy_username, proxy_password=proxy_password, pool_size=pool_size)
 
     def get_mailbox_files(self, computer_id):
         """
         Fetch all mailbox files for the given computer ID.
         """
-        url = f"{self.base_url}/api/mailbox/{computer_id}"
+        endpoint = f"/api/mailbox/{computer_id}"
         try:
-            response = requests.get(url, auth=self.auth, verify=False)
-            response.raise_for_status()
+            response = self.APIRequestHandler.request(method="GET", endpoint=endpoint, username=self.username, password=self.password, verify=self.verify)
             logger.info("Successfully fetched mailbox files.")
             return response.text
-        except requests.RequestException as e:
+        except RuntimeError as e:
             logger.error(f"Error fetching mailbox files: {e}")
             return None
 
-    def parse_cmdb_files(self, xml_data):
+    def parse_cmdb_file_details(self, xml_data):
         """
-        Parse XML data to extract IDs of files starting with 'CMDBData-hashvalue'.
+        Parse XML data to extract ID, name and content hashes of files starting with 'CMDBData-hashvalue'.
         """
-        cmdb_file_ids = []
+        cmdb_files = []
         try:
             root = ET.fromstring(xml_data)
             for file in root.findall("ComputerMailboxFile"):
-                name = file.find("Name").text
-                file_id = file.find("ID").text
+                name = file.findtext("Name") or ""
                 if name.startswith(f"CMDBData-{self.hash_value}"):
-                    cmdb_file_ids.append(file_id)
-            logger.info(f"Parsed XML and found {len(cmdb_file_ids)} 'CMDBData' files.")
+                    cmdb_files.append({
+                        "id": file.findtext("ID"),
+                        "name": name,
+                        "sha1": (file.findtext("SHA1") or "").lower(),
+                        "sha256": (file.findtext("SHA256") or "").lower()
+                    })
         except ET.ParseError as e:
             logger.error(f"Error parsing XML: {e}")
-        return cmdb_file_ids
+        return cmdb_files
 
     def delete_file(self, file_id, computer_id):
         """
         Delete a specific file by its ID.
         """
-        url = f"{self.base_url}/api/mailbox/{computer_id}/{file_id}"
+        endpoint = f"/api/mailbox/{computer_id}/{file_id}"
         try:
-            response = requests.delete(url, auth=self.auth, verify=False)
+            response = self.APIRequestHandler.request(method="DELETE", endpoint=endpoint, username=self.username, password=self.password, verify=self.verify)
             if response.status_code == 200:
                 logger.info(f"Successfully deleted file with ID {file_id}.")
             else:
                 logger.warning(f"Failed to delete file with ID {file_id}: {response.status_code} - {response.text}")
-        except requests.RequestException as e:
+        except RuntimeError as e:
             logger.error(f"Error deleting file with ID {file_id}: {e}")
 
-    def process_and_delete_cmdb_files(self, computer_id):
-        """
-        Fetch all mailbox files, find 'CMDB' files, and delete them.
-        """
-        logger.info("Starting to process and delete 'CMDBData' files.")
-        xml_data = self.get_mailbox_files(computer_id)
-        if xml_data:
-            cmdb_file_ids = self.parse_cmdb_files(xml_data)
-            logger.info(f"Found 'CMDBData' files with IDs: {cmdb_file_ids}")
-            for file_id in cmdb_file_ids:
-                self.delete_file(file_id, computer_id)
-        else:
-            logger.error("No mailbox data to process.")
+    @staticmethod
+    def payload_digest(payload):
+        """Return the SHA256 digest of a mailbox payload."""
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
-    def post_file(self, payload, computer_id):
-        """Send a POST request with a dynamically generated filename."""
+    def file_name(self, computer_id, digest=None):
+        """Build the mailbox file name; the payload digest prefix identifies the file content."""
         filename = f"CMDBData-{self.hash_value}-{computer_id}"
-        url = f"{self.base_url}/api/mailbox/{computer_id}"
+        return f"{filename}-{digest[:16]}" if digest else filename
+
+    def post_file(self, payload, computer_id, digest=None):
+        """Send a POST request with a dynamically generated filename."""
+        filename = self.file_name(computer_id, digest)
+        endpoint = f"/api/mailbox/{computer_id}"
         headers = {
             'Content-Type': 'application/x-www-form-urlencoded',
             'Content-Disposition': f'name="FileContents";filename="{filename}"'
         }
         try:
-            response = requests.post(
-                url,
+            response = self.APIRequestHandler.request(
+                method="POST",
+                endpoint=endpoint,
+                username=self.username,
+                password=self.password,
                 headers=headers,
-                data=payload,
-                auth=self.auth,
-                verify=False  # Disable SSL verification if needed
+                data=payload.encode("utf-8"),
+                verify=self.verify
             )
-            response.raise_for_status()  # Raise an exception for HTTP error responses
             return response
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error during POST request to {url}: {e}")
-            return None  # Return None to indicate an error
\ No newline at end of file
+        except RuntimeError as e:
+            logger.error(f"Error during POST request to {self.base_url}{endpoint}: {e}")
+            return None  # Return None to indicate an error
+
+    def push_file(self, payload, computer_id, known_digest=None):
+        """
+        Replace the 'CMDBData' mailbox file of a computer with the payload.
+        Nothing is sent when known_digest (the digest last pushed to the computer) matches the payload,
+        and the delete and post are skipped when the mailbox already holds an identical file.
+        Returns "pushed", "unchanged" or "failed".
+        """
+        digest = self.payload_digest(payload)
+        if known_digest == digest:
+            logger.info(f"Data for computer ID {computer_id} is unchanged since the last push. Skipping.")
+            return "unchanged"
+
+        content = payload.encode("utf-8")
+        xml_data = self.get_mailbox_files(computer_id)
+        cmdb_files = self.parse_cmdb_file_details(xml_data) if xml_data else []
+
+        if len(cmdb_files) == 1:
+            existing = cmdb_files[0]
+            if existing["name"] == self.file_name(computer_id, digest) or \
+                    (existing["sha256"] and existing["sha256"] == digest) or \
+                    (existing["sha1"] and existing["sha1"] == hashlib.sha1(content).hexdigest()):
+                logger.info(f"Mailbox of computer ID {computer_id} already holds identical data. Skipping.")
+                return "unchanged"
+
+        for cmdb_file in cmdb_files:
+            self.delete_file(cmdb_file["id"], computer_id)
+        response = self.post_file(payload, computer_id, digest)
+        if response and response.status_code == 200:
+            logger.info(f"Data for computer ID {computer_id} pushed successfully.")
+            return "pushed"
+        logger.error(f"Failed to push data for computer ID {computer_id}. Response: {response}")
+        return "failed"
+
+    def push_files(self, payloads, max_workers=1):
+        """
+        Push payloads to the mailboxes of many computers with at most max_workers computers in progress.
+        Digests of delivered payloads are kept in the cache so identical payloads are not sent again.
+
+        :param payloads: List of (computer_id, payload) pairs.
+        :param max_workers: Number of computers processed concurrently.
+        :return: Dictionary mapping each computer ID to "pushed", "unchanged" or "failed".
+        """
+        if self.cache is not None:
+            legacy_digests = self.cache.pop_from_cache("mailbox_digests")
+            if legacy_digests:
+                # Digests written as a single cache key before records were stored individually
+                self.cache.upsert_records("mailbox_digests", legacy_digests)
+
+        def push(item):
+            computer_id, payload = item
+            try:
+                known_digest = self.cache.get_record("mailbox_digests", str(computer_id)) if self.cache is not None else None
+                return computer_id, self.push_file(payload, computer_id, known_digest)
+            except Exception as e:
+                logger.error(f"Failed to push data for computer ID {computer_id}: {e}")
+                return computer_id, "failed"
+
+        if max_workers <= 1 or len(payloads) <= 1:
+            results = dict(push(item) for item in payloads)
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="MailboxPush") as executor:
+                results = dict(executor.map(push, payloads))
+
+        if self.cache is not None:
+            self.cache.upsert_records("mailbox_digests", {
+                str(computer_id): self.payload_digest(payload)
+                for computer_id, payload in payloads if results.get(computer_id) in ("pushed", "unchanged")
+            })
+
+        summary = {status: list(results.values()).count(status) for status in ("pushed", "unchanged", "failed")}
+        logger.info(f"Mailbox push completed: {summary}")
+        return results
\ No newline at end of file
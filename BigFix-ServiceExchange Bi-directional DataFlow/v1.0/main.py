@@ -1,75 +1,46 @@
-def main(provide_credentials=False, init=False, provide_proxy_credentials=False, reset=False, dataflow_filter=None):
+def load_context(config_path, check_site=True):
+    """
+    Parse the configuration, retrieve credentials and build the cache and API handlers used by the dataflows.
+    Both connections are validated once here instead of on every run.
+
+    :param config_path: Path of DataFlowsConfig.xml.
+    :param check_site: Whether to verify that the BigFix custom site exists.
+    :return: Namespace with the handlers and settings, or None if the connections could not be validated.
+    """
     from logger import logger
     from utils.generate_hash_value import CryptoServices
     from credentials_manager.crypto_services import CredentialManager
-    from credentials_manager.config_writer import ConfigWriter
     from bigfix_data_operations.api_handler import BigFixAPIHandler
     from sx_data_operations.api_handler import SXAPIHandler
     from mailbox_records.manage_mailbox_records import MailboxManager
     from bigfix_data_operations.analysis_handler import BigFixAnalysisHandler
-    from data_correlation.data_correlation import DataCorrelation
-    from data_correlation.extract_properties import PropertiesExtractor
     from bigfix_data_operations.site_handler import BigFixSiteHandler
-    from utils.manage_cache import CacheManager
+    from utils.manage_cache import CacheManager, SQLiteCacheManager
     from credentials_manager.user_payload_generator import APIClient
-    import getpass
-    import json
-    import collections
-    import csv
+    from utils.dataflow_config import DataFlowConfig, SX_TO_BF, BF_TO_SX
+    from data_correlation.record_transformer import BigFixToSXTransformer
     import os
-    import sys
-    import xml.etree.ElementTree as ET
+    from types import SimpleNamespace
     from sys import exit
 
-    # Load configuration
-    if getattr(sys, 'frozen', False):
-        # If the application is run as a bundle (PyInstaller)
-        base_dir = os.path.dirname(sys.executable)
-    else:
-        # If run as a script
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-    config_path = os.path.join(base_dir, "DataFlowsConfig.xml")
-    tree = ET.parse(config_path)
-    root = tree.getroot()
-    SETTINGS = {setting.get('key'): setting.get('value') for setting in root.findall(".//settings/setting")}
-
-    # Define file paths
-    preview_records_path = os.path.join(base_dir, "Preview_Records.csv")
+    base_dir = os.path.dirname(config_path)
+    # Parsed once and shared with the logger; the dataflows only read its precomputed mappings
+    config = DataFlowConfig.load(config_path)
+    SETTINGS = config.settings
     cache_path = os.path.join(base_dir, "RecordsCache.json.gz")
-
-    # Generate a unique hash
+    cache_db_path = os.path.join(base_dir, "RecordsCache.db")
     crypto_services = CryptoServices()
-    
-    if reset:
-        # Delete RecordsCache.json.gz if it exists
-        if os.path.exists(cache_path):
-            os.remove(cache_path)
-            print("Deleted RecordsCache.json.gz file.")
-            logger.info("Deleted RecordsCache.json.gz file.")
-        # Find and reset the delta_data setting
-        for setting in root.find('settings'):
-            if setting.attrib.get('key') == 'delta_data':
-                setting.set('value', '')
-                break
-        # Save the updated XML back to file
-        tree.write(config_path, encoding='utf-8', xml_declaration=True)
-        print("Resetting delta_data setting to ''.")
-        logger.info("Resetting delta_data setting to ''.")
-        # Reset unique_hash when --reset flag is used
-        new_hash = crypto_services.generate_unique_hash(config_path=config_path)
-        print(f"Reset completed. New CMDB Hash: {new_hash}")
-        logger.info(f"Reset completed. New CMDB Hash: {new_hash}")
-        return
-    
+
     # Get delta duration value
     delta_data = SETTINGS["delta_data"] if SETTINGS["delta_data"] != "" else None
     logger.info(f"Fetching delta data: {delta_data}")
     print(f"Fetching delta data: {delta_data}")
 
     # Read unique_hash from XML, if empty, generate a new one
-    unique_hash = root.get("uniquehash", "").strip()
+    unique_hash = config.unique_hash
     if not unique_hash:
-        unique_hash = crypto_services.generate_unique_hash(config_path=config_path)
+        unique_hash = crypto_services.generate_unique_hash(config=config)
+        config = DataFlowConfig.load(config_path)
     
     # Check PREVIEW_ONLY setting
     preview_only = True if SETTINGS["preview_only"] == "True" else False
@@ -77,112 +48,52 @@ def main(provide_credentials=False, init=False, provide_proxy_credentials=False,
     # Initialize credentials management
     service = SETTINGS["locker_service_name"]
     credentials_manager = CredentialManager(service)
-    config_writer = ConfigWriter(config_path)
-
-    bigfix_config = root.find(".//datasources/datasource[@datasourcename='BigFixRestAPI']")
-    sx_config = root.find(".//datasources/datasource[@datasourcename='ServiceExchangeAPI']")
 
-    # Handle API credentials
-    if provide_credentials:
-        bigfix_username = input("Enter BigFix Master Operator Username: ")
-        bigfix_password = getpass.getpass("Enter BigFix Master Operator Password: ")
-        credentials_manager.add_credential(bigfix_username, bigfix_password)
-        config_writer.write_username(section="BigFixRestAPI", field="username", username=bigfix_username)
+    bigfix_config = config.datasource("BigFixRestAPI")
+    sx_config = config.datasource("ServiceExchangeAPI")
 
-        sx_username = input("Enter Service Exchange API Username: ")
-        sx_password = getpass.getpass("Enter Service Exchange API Password: ")
-        credentials_manager.add_credential(sx_username, sx_password)
-        sx_client_id = input("Enter Service Exchange API Client ID: ")
-        sx_client_secret = getpass.getpass("Enter Service Exchange API Client Secret: ")
-        credentials_manager.add_credential(sx_client_id, sx_client_secret)
-        config_writer.write_username(section="ServiceExchangeAPI", field="clientid", username=sx_client_id)
-        config_writer.write_username(section="ServiceExchangeAPI", field="username", username=sx_username)
-        return
-    
-    # Handle Proxy credentials
-    if provide_proxy_credentials:
-        bigfix_proxy_username = input("Enter BigFix Proxy Username: ")
-        bigfix_proxy_password = getpass.getpass("Enter BigFix Proxy Password: ")
-        credentials_manager.add_credential(bigfix_proxy_username, bigfix_proxy_password)
-        config_writer.write_username(section="BigFixRestAPI", field="proxyusername", username=bigfix_proxy_username)
-
-        sx_proxy_username = input("Enter Service Exchange Proxy Username: ")
-        sx_proxy_password = getpass.getpass("Enter Service Exchange Proxy Password: ")
-        credentials_manager.add_credential(sx_proxy_username, sx_proxy_password)
-        config_writer.write_username(section="ServiceExchangeAPI", field="proxyusername", username=sx_proxy_username)
-        return
-    
     # Print and log results
-    logger.info(SETTINGS)
-    print(SETTINGS)
+    logger.info(dict(SETTINGS))
+    print(dict(SETTINGS))
     logger.info(f"Using CMDB Hash: {unique_hash}")
     print(f"Using CMDB Hash: {unique_hash}")
 
-    # List of dataflow names to extract properties for
-    dataflow_names = [
-        "Transfer Asset Data from ServiceExchange to Bigfix",
-        "Transfer Asset Data from Bigfix to ServiceExchange"
-    ]
-    # Dictionary to store properties for each dataflow
-    dataflows_properties = {}
+    # Properties for each dataflow, None for dataflows that are not configured
+    dataflows_properties = config.dataflows_properties
 
-    for dataflow_name in dataflow_names:
-        dataflow = root.find(f".//dataflows/dataflow[@displayname='{dataflow_name}']")
-        
-        if dataflow is not None:
-            properties_dict = {}
-            for adapter in ["sourceadapter", "targetadapter"]:
-                adapter_element = dataflow.find(adapter)
-                if adapter_element is not None:
-                    datasource_name = adapter_element.get("datasourcename")
-                    device_properties = adapter_element.find("device_properties")
-                    
-                    if device_properties is not None:
-                        adapter_properties = {}
-                        # Include <property> and <identityproperty> nodes
-                        for prop_node in device_properties.findall("./property") + device_properties.findall("./identityproperty"):
-                            displayname = prop_node.get("displayname")
-                            propertyname = prop_node.get("propertyname")
-                            proptype = prop_node.get("type", "general")  # Default to 'general' if 'type' is missing
-                            adapter_properties[displayname] = {
-                                "propertyname": propertyname,
-                                "type": proptype
-                            }
-                        properties_dict[datasource_name] = adapter_properties
-            dataflows_properties[dataflow_name] = properties_dict
-        else:
-            dataflows_properties[dataflow_name] = None
-
-    print("Requested dataflow:", dataflow_filter)
-    logger.info(f"Requested dataflow: {dataflow_filter}")
-
-    # Integrating logic for multiple schedules
-    if dataflow_filter:
-        # Skip all dataflows except the one specified
-        for df_name in list(dataflows_properties.keys()):
-            if df_name != dataflow_filter:
-                dataflows_properties.pop(df_name)
-    print("Available dataflows:", list(dataflows_properties.keys()))
-    logger.info(f"Available dataflows: {list(dataflows_properties.keys())}")
-    
     # Dataflow check
-    if "Transfer Asset Data from ServiceExchange to Bigfix" in dataflows_properties:
-        bigfix_properties_sx_to_bf = dataflows_properties["Transfer Asset Data from ServiceExchange to Bigfix"]["BigFixRestAPI"]
-        sx_properties_sx_to_bf = dataflows_properties["Transfer Asset Data from ServiceExchange to Bigfix"]["ServiceExchangeAPI"]
-    else:
-        dataflows_properties["Transfer Asset Data from ServiceExchange to Bigfix"] = None
-        bigfix_properties_sx_to_bf = None
-        sx_properties_sx_to_bf = None
-
-    if "Transfer Asset Data from Bigfix to ServiceExchange" in dataflows_properties:
-        bigfix_properties_bf_to_sx = dataflows_properties["Transfer Asset Data from Bigfix to ServiceExchange"]["BigFixRestAPI"]
-        sx_properties_bf_to_sx = dataflows_properties["Transfer Asset Data from Bigfix to ServiceExchange"]["ServiceExchangeAPI"]
-    else:
-        dataflows_properties["Transfer Asset Data from Bigfix to ServiceExchange"] = None
-        bigfix_properties_bf_to_sx = None
-        sx_properties_bf_to_sx = None
+    sx_to_bf_properties = dataflows_properties.get(SX_TO_BF) or {}
+    bf_to_sx_properties = dataflows_properties.get(BF_TO_SX) or {}
+    bigfix_properties_sx_to_bf = sx_to_bf_properties.get("BigFixRestAPI")
+    sx_properties_sx_to_bf = sx_to_bf_properties.get("ServiceExchangeAPI")
+    bigfix_properties_bf_to_sx = bf_to_sx_properties.get("BigFixRestAPI")
+    sx_properties_bf_to_sx = bf_to_sx_properties.get("ServiceExchangeAPI")
+    # Compiled once; converts BigFix records to SX records without looking at the configuration again
+    bf_to_sx_transformer = BigFixToSXTransformer.from_config(config)
 
     record_limit = SETTINGS["record_limit_per_page"]
+    bigfix_fetch_mode = SETTINGS.get("bigfix_fetch_mode", "per_computer")
+    bigfix_max_in_flight = int(SETTINGS.get("bigfix_max_in_flight", 1))
+    bigfix_requests_per_second = float(SETTINGS.get("bigfix_requests_per_second", 0))
+    http_pool_size = int(SETTINGS.get("http_pool_size", 10))
+    sx_max_in_flight = int(SETTINGS.get("sx_max_in_flight", 1))
+    sx_retries = int(SETTINGS.get("sx_retries", 0))
+    sx_upload_workers = int(SETTINGS.get("sx_upload_workers", 1))
+    sx_upload_target_seconds = float(SETTINGS.get("sx_upload_target_seconds", 0))
+    mailbox_max_in_flight = int(SETTINGS.get("mailbox_max_in_flight", 1))
+    mailbox_transport = SETTINGS.get("mailbox_transport", "mailbox")
+    bigfix_delta = True if SETTINGS.get("bigfix_delta") == "True" else False
+    bigfix_snapshot_ttl = float(SETTINGS.get("bigfix_snapshot_ttl", 0))
+    correlation_mode = SETTINGS.get("correlation_mode", "first_match")
+    minimum_confidence = int(SETTINGS.get("minimum_confidence_level") or 0)
+    # Identity properties without a weight match on their own unless configured otherwise
+    identity_default_weight = int(SETTINGS.get("identity_default_weight") or minimum_confidence)
+    cache_backend = SETTINGS.get("cache_backend", "json")
+    if cache_backend == "sqlite":
+        # Existing JSON cache is imported on first use
+        cache = SQLiteCacheManager(cache_db_path, legacy_filename=cache_path)
+    else:
+        cache = CacheManager(cache_path)
     # Retrieve credentials and Initialize API Handlers
     bigfix_username = bigfix_config.get("username")
     bigfix_password = credentials_manager.retrieve_password(bigfix_username)
@@ -193,13 +104,13 @@ def main(provide_credentials=False, init=False, provide_proxy_credentials=False,
     if bigfix_proxy_url:
         bigfix_proxy_username = bigfix_config.get("proxyusername")
         bigfix_proxy_password = credentials_manager.retrieve_password(bigfix_proxy_username)
-        bigfix_api = BigFixAPIHandler(config_path=config_path, base_url=bigfix_connection, username=bigfix_username, password=bigfix_password, proxy_url=bigfix_proxy_url, proxy_username=bigfix_proxy_username, proxy_password=bigfix_proxy_password, verify=bigfix_ssl_verify, bigfix_properties_sx_to_bf=bigfix_properties_sx_to_bf)
-        bes_site = BigFixSiteHandler(base_url=bigfix_connection, username=bigfix_username, password=bigfix_password, site_name=bigfix_site_name, proxy_url=bigfix_proxy_url, proxy_username=bigfix_proxy_username, proxy_password=bigfix_proxy_password, verify=bigfix_ssl_verify)
-        analysis_manager = BigFixAnalysisHandler(base_url=bigfix_connection, username=bigfix_username, password=bigfix_password, site_name=bigfix_site_name, hash_value=unique_hash, proxy_url=bigfix_proxy_url, proxy_username=bigfix_proxy_username, proxy_password=bigfix_proxy_password, verify=bigfix_ssl_verify)
+        bigfix_api = BigFixAPIHandler(config_path=config_path, base_url=bigfix_connection, username=bigfix_username, password=bigfix_password, proxy_url=bigfix_proxy_url, proxy_username=bigfix_proxy_username, proxy_password=bigfix_proxy_password, verify=bigfix_ssl_verify, bigfix_properties_sx_to_bf=bigfix_properties_sx_to_bf, bigfix_properties_bf_to_sx=bigfix_properties_bf_to_sx, fetch_mode=bigfix_fetch_mode, max_in_flight=bigfix_max_in_flight, requests_per_second=bigfix_requests_per_second, pool_size=http_pool_size, delta_mode=bigfix_delta, cache=cache, snapshot_ttl=bigfix_snapshot_ttl)
+        bes_site = BigFixSiteHandler(base_url=bigfix_connection, username=bigfix_username, password=bigfix_password, site_name=bigfix_site_name, proxy_url=bigfix_proxy_url, proxy_username=bigfix_proxy_username, proxy_password=bigfix_proxy_password, verify=bigfix_ssl_verify, cache=cache)
+        analysis_manager = BigFixAnalysisHandler(base_url=bigfix_connection, username=bigfix_username, password=bigfix_password, site_name=bigfix_site_name, hash_value=unique_hash, proxy_url=bigfix_proxy_url, proxy_username=bigfix_proxy_username, proxy_password=bigfix_proxy_password, verify=bigfix_ssl_verify, transport=mailbox_transport, cache=cache)
     else:
-        bigfix_api = BigFixAPIHandler(config_path=config_path, base_url=bigfix_connection, username=bigfix_username, password=bigfix_password, proxy_url=None, proxy_username=None, proxy_password=None, verify=bigfix_ssl_verify, bigfix_properties_sx_to_bf=bigfix_properties_sx_to_bf)
-        bes_site = BigFixSiteHandler(base_url=bigfix_connection, username=bigfix_username, password=bigfix_password, site_name=bigfix_site_name, proxy_url=None, proxy_username=None, proxy_password=None, verify=bigfix_ssl_verify)
-        analysis_manager = BigFixAnalysisHandler(base_url=bigfix_connection, username=bigfix_username, password=bigfix_password, site_name=bigfix_site_name, hash_value=unique_hash, proxy_url=None, proxy_username=None, proxy_password=None, verify=bigfix_ssl_verify)
+        bigfix_api = BigFixAPIHandler(config_path=config_path, base_url=bigfix_connection, username=bigfix_username, password=bigfix_password, proxy_url=None, proxy_username=None, proxy_password=None, verify=bigfix_ssl_verify, bigfix_properties_sx_to_bf=bigfix_properties_sx_to_bf, bigfix_properties_bf_to_sx=bigfix_properties_bf_to_sx, fetch_mode=bigfix_fetch_mode, max_in_flight=bigfix_max_in_flight, requests_per_second=bigfix_requests_per_second, pool_size=http_pool_size, delta_mode=bigfix_delta, cache=cache, snapshot_ttl=bigfix_snapshot_ttl)
+        bes_site = BigFixSiteHandler(base_url=bigfix_connection, username=bigfix_username, password=bigfix_password, site_name=bigfix_site_name, proxy_url=None, proxy_username=None, proxy_password=None, verify=bigfix_ssl_verify, cache=cache)
+        analysis_manager = BigFixAnalysisHandler(base_url=bigfix_connection, username=bigfix_username, password=bigfix_password, site_name=bigfix_site_name, hash_value=unique_hash, proxy_url=None, proxy_username=None, proxy_password=None, verify=bigfix_ssl_verify, transport=mailbox_transport, cache=cache)
     
     sx_username = sx_config.get("username")
     sx_password = credentials_manager.retrieve_password(sx_username)
@@ -209,40 +120,16 @@ def main(provide_credentials=False, init=False, provide_proxy_credentials=False,
     sx_client_id = sx_config.get("clientid")
     sx_client_secret = credentials_manager.retrieve_password(sx_client_id)
     sx_token_url = sx_config.get("tokenurl")
-    sx_user_payload_api = APIClient(client_id=sx_client_id, client_secret=sx_client_secret, token_url=sx_token_url, base_url=sx_connection, username=sx_username, password=sx_password)
     sx_user_payload_api_endpoint = "fdn/xsmauth/authorize"
-    sx_user_payload = sx_user_payload_api.make_request(sx_user_payload_api_endpoint)
     if sx_proxy_url:
         sx_proxy_username = sx_config.get("proxyusername")
         sx_proxy_password = credentials_manager.retrieve_password(sx_proxy_username)
-        sx_api = SXAPIHandler(config_path=config_path, record_limit=record_limit, base_url=sx_connection, username=sx_username, password=sx_password, proxy_url=sx_proxy_url, proxy_username=sx_proxy_username, proxy_password=sx_proxy_password, verify=sx_ssl_verify, x_user_payload=sx_user_payload, sx_properties_sx_to_bf=sx_properties_sx_to_bf, delta=delta_data)
+        sx_user_payload_api = APIClient(client_id=sx_client_id, client_secret=sx_client_secret, token_url=sx_token_url, base_url=sx_connection, username=sx_username, password=sx_password, proxy_url=sx_proxy_url, proxy_username=sx_proxy_username, proxy_password=sx_proxy_password, pool_size=http_pool_size)
+        sx_api = SXAPIHandler(config_path=config_path, record_limit=record_limit, base_url=sx_connection, username=sx_username, password=sx_password, proxy_url=sx_proxy_url, proxy_username=sx_proxy_username, proxy_password=sx_proxy_password, verify=sx_ssl_verify, x_user_payload=None, sx_properties_sx_to_bf=sx_properties_sx_to_bf, delta=delta_data, pool_size=http_pool_size, max_in_flight=sx_max_in_flight, page_retries=sx_retries, upload_workers=sx_upload_workers, upload_target_seconds=sx_upload_target_seconds)
     else:
-        sx_api = SXAPIHandler(config_path=config_path, record_limit=record_limit, base_url=sx_connection, username=sx_username, password=sx_password, proxy_url=None, proxy_username=None, proxy_password=None, verify=sx_ssl_verify, x_user_payload=sx_user_payload, sx_properties_sx_to_bf=sx_properties_sx_to_bf, delta=delta_data)
-
-    # Handle init operations
-    if init:
-        try:
-            bigfix_test_connection = bigfix_api.validate_connection()
-            if bigfix_test_connection == 200:
-                logger.info("BigFix Connection Validation Completed successfully!")
-                print("BigFix Connection Validation Completed successfully!")
-            else:
-                logger.error("BigFix Connection Validation Failed!")
-                print("BigFix Connection Validation Failed!")
-                exit(100)
-            sx_test_connection = sx_api.validate_connection()
-            if sx_test_connection == 200:
-                logger.info("ServiceExchange Connection Validation Completed successfully!")
-                print("ServiceExchange Connection Validation Completed successfully!")
-            else:
-                logger.error("ServiceExchange Connection Validation Failed!")
-                print("ServiceExchange Connection Validation Failed!")
-                exit(100)
-            return
-        except Exception as e:
-            logger.error(f"Error during processing: {e}")
-            return
-    
+        sx_user_payload_api = APIClient(client_id=sx_client_id, client_secret=sx_client_secret, token_url=sx_token_url, base_url=sx_connection, username=sx_username, password=sx_password, pool_size=http_pool_size)
+        sx_api = SXAPIHandler(config_path=config_path, record_limit=record_limit, base_url=sx_connection, username=sx_username, password=sx_password, proxy_url=None, proxy_username=None, proxy_password=None, verify=sx_ssl_verify, x_user_payload=None, sx_properties_sx_to_bf=sx_properties_sx_to_bf, delta=delta_data, pool_size=http_pool_size, max_in_flight=sx_max_in_flight, page_retries=sx_retries, upload_workers=sx_upload_workers, upload_target_seconds=sx_upload_target_seconds)
+
     # Handle connection tests
     try:
         bigfix_test_connection = bigfix_api.validate_connection()
@@ -263,47 +150,100 @@ def main(provide_credentials=False, init=False, provide_proxy_credentials=False,
             exit(100)
     except Exception as e:
         logger.error(f"Error during processing: {e}")
-        return
+        return None
 
-    mailbox_manager = MailboxManager(bigfix_connection, bigfix_username, bigfix_password, unique_hash)
-    properties = PropertiesExtractor(config_path)
-    cache = CacheManager(cache_path)
+    if bigfix_proxy_url:
+        mailbox_manager = MailboxManager(bigfix_connection, bigfix_username, bigfix_password, unique_hash, proxy_url=bigfix_proxy_url, proxy_username=bigfix_proxy_username, proxy_password=bigfix_proxy_password, pool_size=http_pool_size, cache=cache)
+    else:
+        mailbox_manager = MailboxManager(bigfix_connection, bigfix_username, bigfix_password, unique_hash, pool_size=http_pool_size, cache=cache)
+
+    if check_site and not bes_site.get_site():
+        logger.error("BigFix site does not exist.")
+        exit(100)
+
+    return SimpleNamespace(
+        config_path=config_path,
+        config=config,
+        dataflows_properties=dataflows_properties,
+        bf_to_sx_transformer=bf_to_sx_transformer,
+        delta_data=delta_data,
+        preview_only=preview_only,
+        correlation_mode=correlation_mode,
+        minimum_confidence=minimum_confidence,
+        identity_default_weight=identity_default_weight,
+        mailbox_transport=mailbox_transport,
+        mailbox_max_in_flight=mailbox_max_in_flight,
+        cache=cache,
+        bigfix_api=bigfix_api,
+        bes_site=bes_site,
+        analysis_manager=analysis_manager,
+        mailbox_manager=mailbox_manager,
+        sx_api=sx_api,
+        sx_user_payload_api=sx_user_payload_api,
+        sx_user_payload_api_endpoint=sx_user_payload_api_endpoint
+    )
+
+
+def run_dataflows(context, dataflow_filter=None):
+    """
+    Run the configured dataflows, or only dataflow_filter, with the handlers of a loaded context.
+    The context can be reused for any number of runs.
+    """
+    from logger import logger
+    from data_correlation.data_correlation import DataCorrelation
+    from utils.dataflow_config import SX_TO_BF, BF_TO_SX
+    from utils import codec
+    import collections
+    import itertools
+
+    config = context.config
+    delta_data = context.delta_data
+    preview_only = context.preview_only
+    correlation_mode = context.correlation_mode
+    minimum_confidence = context.minimum_confidence
+    identity_default_weight = context.identity_default_weight
+    mailbox_transport = context.mailbox_transport
+    mailbox_max_in_flight = context.mailbox_max_in_flight
+    cache = context.cache
+    bigfix_api = context.bigfix_api
+    bes_site = context.bes_site
+    analysis_manager = context.analysis_manager
+    mailbox_manager = context.mailbox_manager
+    sx_api = context.sx_api
 
-    try:
-        if not bes_site.get_site():
-            logger.error("BigFix site does not exist.")
-            exit(100)
+    print("Requested dataflow:", dataflow_filter)
+    logger.info(f"Requested dataflow: {dataflow_filter}")
 
+    # Integrating logic for multiple schedules: skip all dataflows except the one specified
+    dataflows_properties = {
+        name: properties if not dataflow_filter or name == dataflow_filter else None
+        for name, properties in context.dataflows_properties.items()
+    }
+    available_dataflows = [name for name in dataflows_properties if not dataflow_filter or name == dataflow_filter]
+    print("Available dataflows:", available_dataflows)
+    logger.info(f"Available dataflows: {available_dataflows}")
+
+    # The client caches the user payload with its token and renews both shortly before expiry
+    sx_api.headers['x-user-payload'] = context.sx_user_payload_api.make_request(context.sx_user_payload_api_endpoint)
+
+    try:
         logger.info("Fetching data from BigFix...")
         bigfix_data = bigfix_api.get_computer_data() or []
         print(bigfix_data)
         
-        # Parse DataFlow XML
-        dataflow_root = (ET.parse(config_path)).getroot()
-        
         ############# Transfer Asset Data from ServiceExchange to Bigfix #############
         def handle_sx_to_bigfix():
-            if not dataflows_properties.get('Transfer Asset Data from ServiceExchange to Bigfix'):
+            if not dataflows_properties.get(SX_TO_BF):
                 return
 
             logger.info("Handling SX → BigFix flow...")
             correlated_data = None
-            logger.info("Fetching data from SX...")
-            sx_data = sx_api.get_computer_data() or []
-            print(sx_data)
-            
-            if not bigfix_data or not sx_data:
+            if not bigfix_data:
                 logger.error("Data not available to correlate.")
                 return
-            
-            # Extract mappings from BigFix property names to display names
-            bf_mappings = {}
-            for dataflow in dataflow_root.findall(".//dataflow[@displayname='Transfer Asset Data from ServiceExchange to Bigfix']"):
-                for targetadapter in dataflow.findall(".//targetadapter[@displayname='Bigfix Adapter']"):
-                    for property_tag in targetadapter.findall(".//device_properties/*"):
-                        display_name = property_tag.attrib["displayname"]
-                        backend_name = property_tag.attrib["propertyname"]
-                        bf_mappings[backend_name] = display_name
+
+            # Mappings from BigFix property names to display names
+            bf_mappings = config.bf_mappings
 
             # Convert BigFix data to the required format
             bigfix_data_sx_to_bf = []
@@ -312,22 +252,30 @@ def main(provide_credentials=False, init=False, provide_proxy_credentials=False,
                 bigfix_data_sx_to_bf.append(formatted_entry)
             print(bigfix_data_sx_to_bf)
             
-            # Extract mappings from SX property names to display names
-            sx_mappings = {}
-            for dataflow in dataflow_root.findall(".//dataflow[@displayname='Transfer Asset Data from ServiceExchange to Bigfix']"):
-                for sourceadapter in dataflow.findall(".//sourceadapter[@displayname='ServiceExchange Adapter']"):
-                    for property_tag in sourceadapter.findall(".//device_properties/*"):
-                        display_name = property_tag.attrib["displayname"]
-                        backend_name = property_tag.attrib["propertyname"]
-                        sx_mappings[backend_name] = display_name
-
-            # Convert ServiceExchange data to the required format
-            sx_data_sx_to_bf = []
-            for entry in sx_data:
-                formatted_entry = {sx_mappings[key]: value for key, value in entry.items() if key in sx_mappings}
-                sx_data_sx_to_bf.append(formatted_entry)
-                print(formatted_entry)
-            print(sx_data_sx_to_bf)
+            # Mappings from SX property names to display names
+            sx_mappings = config.sx_mappings
+
+            # Without cached site file rows the first file must cover every correlated computer,
+            # so all CIs are fetched and correlated instead of only the new or changed ones
+            seed_site_file = mailbox_transport == "site_file" and not preview_only and not bes_site.has_rows(analysis_manager.site_file_name)
+            if seed_site_file:
+                logger.info("No site file rows are cached. Correlating every ServiceExchange CI to build the site file.")
+
+            # Stream ServiceExchange data page by page; only new or changed records are kept in memory
+            logger.info("Fetching data from SX...")
+            sx_data = sx_api.iter_computer_data(full=seed_site_file)
+            first_entry = next(sx_data, None)
+            if first_entry is None:
+                logger.error("Data not available to correlate.")
+                return
+
+            def format_sx_data():
+                # Convert ServiceExchange data to the required format
+                for entry in itertools.chain([first_entry], sx_data):
+                    formatted_entry = {sx_mappings[key]: value for key, value in entry.items() if key in sx_mappings}
+                    print(formatted_entry)
+                    yield formatted_entry
+            sx_data_sx_to_bf = format_sx_data()
 
             def clean_value(val):
                 return "" if val in (None, "null", "NULL", "None") else str(val).strip()
@@ -337,38 +285,41 @@ def main(provide_credentials=False, init=False, provide_proxy_credentials=False,
                     d = {k: d[k] for k in d if k in allowed_keys}
                 return collections.OrderedDict(sorted((k, clean_value(v)) for k, v in d.items()))
 
-            # Load and normalize cache
-            sx_to_bf_cache = cache.load_from_cache('sx_to_bf') or {}
-            cached_sx_data = [normalize_dict(d, sx_mappings.values()) for d in sx_to_bf_cache.get("sx_data", [])]
+            sx_id_display_name = config.sx_id_display_name
+            all_sx_data = []
 
-            # Normalize current data
-            normalized_sx_data = [normalize_dict(d, sx_mappings.values()) for d in sx_data_sx_to_bf]
+            def keyed_sx_data():
+                for entry in sx_data_sx_to_bf:
+                    if seed_site_file:
+                        all_sx_data.append(entry)
+                    yield entry.get(sx_id_display_name), entry
 
-            # Compute new records
-            new_sx_data = [original for original, norm in zip(sx_data_sx_to_bf, normalized_sx_data) if norm not in cached_sx_data]
+            # Compute new and changed records against the cached hash index, keyed by CI ID
+            sx_changes = cache.detect_changes(
+                'sx_to_bf',
+                keyed_sx_data(),
+                normalize=lambda entry: normalize_dict(entry, sx_mappings.values()),
+                complete=delta_data is None or seed_site_file
+            )
+            new_sx_data = all_sx_data if seed_site_file else sx_changes.changed
 
             print("New SX Data:", new_sx_data)
             logger.info(f"New SX Data: {new_sx_data}")
+            if sx_changes.deleted:
+                logger.info(f"CIs removed from ServiceExchange since the last run: {sx_changes.deleted}")
 
-            # Save updated cache
-            sx_to_bf_cache = {
-                'sx_data': sx_data_sx_to_bf
-            }
-            cache.save_to_cache('sx_to_bf', sx_to_bf_cache)
-            
             if not new_sx_data:
                 logger.info("No new or changed data in ServiceExchange to process.")
                 print("No new or changed data in ServiceExchange to process.")
                 return
 
             logger.info("Sending new Service Exchange data to BigFix data ...")
-            identity_properties = DataCorrelation.parse_identity_properties(config_path)
+            identity_properties = config.identity_properties
             print(identity_properties)
-            
-            # Parse XML and extract mappings
-            root = (ET.parse(config_path)).getroot()
 
-            correlated_data = DataCorrelation.correlate(bigfix_data=bigfix_data_sx_to_bf, sx_data=new_sx_data, bigfix_properties=dataflows_properties['Transfer Asset Data from ServiceExchange to Bigfix']['BigFixRestAPI'], sx_properties=dataflows_properties['Transfer Asset Data from ServiceExchange to Bigfix']['ServiceExchangeAPI'], identity_properties=identity_properties)
+            # Weighted matching scores candidates with the identity property weights
+            identity_weights = config.identity_weights if correlation_mode == "weighted" else None
+            correlated_data = DataCorrelation.correlate(bigfix_data=bigfix_data_sx_to_bf, sx_data=new_sx_data, bigfix_properties=dataflows_properties[SX_TO_BF]['BigFixRestAPI'], sx_properties=dataflows_properties[SX_TO_BF]['ServiceExchangeAPI'], identity_properties=identity_properties, identity_weights=identity_weights, minimum_confidence=minimum_confidence, default_weight=identity_default_weight)
             ####################################################
             print(correlated_data)
             logger.info(f"Correlated Data: {correlated_data}")
@@ -380,8 +331,8 @@ def main(provide_credentials=False, init=False, provide_proxy_credentials=False,
 
                     # Write JSON output to a file
                     output_filename = "Preview_Records_SXtoBF.json"
-                    with open(output_filename, "w", encoding="utf-8") as json_file:
-                        json.dump(correlated_data, json_file, separators=(",", ":"))
+                    with open(output_filename, "wb") as json_file:
+                        json_file.write(codec.dumps_bytes(correlated_data))
                     
                     logger.info(f"JSON output saved to {output_filename} with indentation level {indent_value}.")
                     print(f"JSON output saved to {output_filename} with indentation level {indent_value}.")
@@ -391,37 +342,36 @@ def main(provide_credentials=False, init=False, provide_proxy_credentials=False,
                     print("Creating BigFix analysis...")
                     analysis_name = "ServiceExchange Custom Properties"
                     analysis_description = "Analysis of correlated data between BigFix and ServiceExchange systems."
-                    root = (ET.parse(config_path)).getroot()
-                    property_names = [p.attrib["displayname"] for p in root.find(".//sourceadapter/device_properties").findall("*")] + [p.attrib["displayname"] for p in root.find(".//targetadapter/device_properties").findall("property")]
+                    property_names = list(config.property_names)
                     logger.info(f"Properties in Analysis: {property_names}")
                     print(property_names)
                     extracted_properties = analysis_manager.get_properties(property_names)
-                    payload = analysis_manager.generate_analysis_payload(analysis_name, analysis_description, extracted_properties)
-
-                    analysis_id = analysis_manager.get_analysis_id()
-                    if analysis_id:
-                        analysis_manager.put_analysis(analysis_id, payload)
-                    else:
-                        analysis_manager.post_analysis(payload)
+                    analysis_manager.publish_analysis(analysis_name, analysis_description, extracted_properties)
 
+                    bigfix_ID_propName = config.bigfix_id_display_name
+                    mailbox_payloads = []
                     for record in correlated_data:
                         payload = ",".join(str(record.get(prop, "")).replace(",", ";") for prop in property_names)
                         print(payload)
                         logger.info(payload)
-                        bigfix_ID_propName = next((p.attrib["displayname"] for p in root.find(".//dataflow[@displayname='Transfer Asset Data from ServiceExchange to Bigfix']/.//targetadapter[@displayname='Bigfix Adapter']").findall(".//device_properties/*") if p.attrib.get("propertyname") == "ID"), None)
-                        computer_id = record.get(bigfix_ID_propName)
-                        mailbox_manager.process_and_delete_cmdb_files(computer_id)
-                        response = mailbox_manager.post_file(payload, computer_id)
-                        if response and response.status_code == 200:
-                            logger.info(f"Data for computer ID {computer_id} pushed successfully.")
-                        else:
-                            logger.error(f"Failed to push data for computer ID {computer_id}. Response: {response}")
+                        mailbox_payloads.append((record.get(bigfix_ID_propName), payload))
+
+                    if mailbox_transport == "site_file":
+                        push_results = bes_site.push_rows(mailbox_payloads, analysis_manager.site_file_name, computer_ids=[device.get("ID") for device in bigfix_data])
+                    else:
+                        push_results = mailbox_manager.push_files(mailbox_payloads, max_workers=mailbox_max_in_flight)
+                    failed_computers = [computer_id for computer_id, status in push_results.items() if status == "failed"]
+                    if failed_computers:
+                        logger.error(f"Failed to push data for computer IDs: {failed_computers}")
+                        # Resend the CIs of failed computers on the next run
+                        failed_ci_ids = [str(record.get(sx_id_display_name)) for record in correlated_data if push_results.get(record.get(bigfix_ID_propName)) == "failed"]
+                        cache.forget_records('sx_to_bf', failed_ci_ids)
             else:
                 logger.info("No correlation found between BigFix and ServiceExchange Computer Data.")
 
         ############# Transfer Asset Data from Bigfix to ServiceExchange #############
         def handle_bigfix_to_sx():
-            if not dataflows_properties.get('Transfer Asset Data from Bigfix to ServiceExchange'):
+            if not dataflows_properties.get(BF_TO_SX):
                 return
 
             logger.info("Handling BigFix → SX flow...")
@@ -429,103 +379,35 @@ def main(provide_credentials=False, init=False, provide_proxy_credentials=False,
                 logger.error("BigFix Data not available to correlate/send to ServiceExchange.")
                 return
 
-            # Create mapping dictionaries
-            bigfix_direct_mapping = {}  # For <property> and <identityproperty>
-            bigfix_setting_mapping = {}  # For <setting>
-
-            # Find the correct dataflow
-            dataflow = dataflow_root.find(".//dataflow[@displayname='Transfer Asset Data from Bigfix to ServiceExchange']")
-            if dataflow is None:
-                logger.error("ERROR: DataFlow not found!")
-                return
-
-            source_adapter = dataflow.find(".//sourceadapter")
-            target_adapter = dataflow.find(".//targetadapter")
-
-            if source_adapter is None or target_adapter is None:
-                logger.error("ERROR: Source or Target Adapter missing in DataFlow XML")
-                return
-
-            source_device_props = source_adapter.find(".//device_properties")
-            target_device_props = target_adapter.find(".//device_properties")
-
-            if source_device_props is None or target_device_props is None:
+            transformer = context.bf_to_sx_transformer
+            if transformer is None:
                 logger.error("ERROR: device_properties missing in source or target adapter")
                 return
 
-            source_properties = list(source_device_props)
-            target_properties = list(target_device_props)
-
-            # Separate mapping creation
-            for src_prop, tgt_prop in zip(source_properties, target_properties):
-                src_name = src_prop.get("propertyname")
-                tgt_name = tgt_prop.get("propertyname")
-                tag = src_prop.tag.lower()
-
-                if not src_name or not tgt_name:
-                    continue
-
-                if tag == "setting":
-                    bigfix_setting_mapping[src_name] = tgt_name
-                else:
-                    bigfix_direct_mapping[src_name] = tgt_name
-
             # Debug: show mapping
-            logger.info(f"Direct property mapping: {bigfix_direct_mapping}")
-            logger.info(f"Client setting mapping: {bigfix_setting_mapping}")
+            logger.info(f"Direct property mapping: {dict(transformer.direct_fields)}")
+            logger.info(f"Client setting mapping: {dict(transformer.setting_fields)}")
+            logger.info(f"Custom tag properties: {list(transformer.custom_tags)}")
 
             # Build BigFix to SX mapped data
             bigfix_data_bf_to_sx = []
             for device in bigfix_data:
-                device_data = {}
-
-                # Handle direct properties (property / identityproperty)
-                for bf_key, sx_key in bigfix_direct_mapping.items():
-                    value = device.get(bf_key)
-                    if value is not None:
-                        device_data[sx_key] = value
-
-                # Handle settings from "Client Settings" string
-                client_settings_str = device.get("Client Settings", "")
-                settings_dict = {}
-
-                if client_settings_str:
-                    for setting in client_settings_str.split(","):
-                        if "=" in setting:
-                            k, v = setting.split("=", 1)
-                            settings_dict[k.strip()] = v.strip()
-
-                for bf_key, sx_key in bigfix_setting_mapping.items():
-                    if bf_key in settings_dict:
-                        device_data[sx_key] = settings_dict[bf_key]
-
-                # Inject custom fields into tag format
-                    custom_tags = []
-                    for prop in target_properties:
-                        tag_type = prop.get("type", "general")
-                        if tag_type == "custom":
-                            tag_name = prop.get("propertyname")
-                            tag_value = device_data.pop(tag_name, None)  # remove if present
-                            if tag_value is not None:
-                                custom_tags.append({
-                                    "tag_name": tag_name,
-                                    "tag_value": tag_value,
-                                    "tag_mandatory": False
-                                })
-
-                    if custom_tags:
-                        device_data["tag"] = {"tag_data": custom_tags}
-
+                device_data = transformer.transform(device)
                 # Debug: show transformed device data
                 print(device_data)
                 bigfix_data_bf_to_sx.append(device_data)
 
-            cached_bigfix_data = cache.load_from_cache('bf_to_sx') or []
-            new_bigfix_data = [data for data in bigfix_data_bf_to_sx if data not in cached_bigfix_data]
+            # Compute new and changed records against the cached hash index, keyed by BigFix computer ID
+            bigfix_changes = cache.detect_changes(
+                'bf_to_sx',
+                zip((device.get("ID") for device in bigfix_data), bigfix_data_bf_to_sx)
+            )
+            new_bigfix_data = bigfix_changes.changed
             print(new_bigfix_data)
             logger.info(f"New BigFix Data: {new_bigfix_data}")
-            
-            cache.save_to_cache('bf_to_sx', bigfix_data_bf_to_sx)
+            if bigfix_changes.deleted:
+                logger.info(f"Computers removed from BigFix since the last run: {bigfix_changes.deleted}")
+
             if not new_bigfix_data:
                 logger.info("No new or changed data in BigFix for sending out to ServiceExchange.")
                 print("No new or changed data in BigFix for sending out to ServiceExchange.")
@@ -540,25 +422,132 @@ def main(provide_credentials=False, init=False, provide_proxy_credentials=False,
 
                     # Write JSON output to a file
                     output_filename = "Preview_Records_BFtoSX.json"
-                    with open(output_filename, "w", encoding="utf-8") as json_file:
-                        json.dump(new_bigfix_data, json_file, separators=(",", ":"))
+                    with open(output_filename, "wb") as json_file:
+                        json_file.write(codec.dumps_bytes(new_bigfix_data))
                     
                     logger.info(f"JSON output saved to {output_filename} with indentation level {indent_value}.")
                     print(f"JSON output saved to {output_filename} with indentation level {indent_value}.")
                     return
 
-                sx_api.post_computer_details(new_bigfix_data)
+                failed_positions = sx_api.post_computer_details(new_bigfix_data)
+                if failed_positions:
+                    # Drop failed records from the index so the next run resends only those
+                    cache.forget_records('bf_to_sx', [bigfix_changes.changed_ids[position] for position in failed_positions])
 
         ############# Processing DataFlow #############
-        if dataflows_properties['Transfer Asset Data from ServiceExchange to Bigfix']:
+        if dataflows_properties[SX_TO_BF]:
             handle_sx_to_bigfix()
-        if dataflows_properties['Transfer Asset Data from Bigfix to ServiceExchange']:
+        if dataflows_properties[BF_TO_SX]:
             handle_bigfix_to_sx()
             
     except Exception as e:
         logger.error(f"Error during processing: {e}")
 
 
+
+def main(provide_credentials=False, init=False, provide_proxy_credentials=False, reset=False, dataflow_filter=None):
+    from logger import logger
+    from utils.generate_hash_value import CryptoServices
+    from credentials_manager.crypto_services import CredentialManager
+    from credentials_manager.config_writer import ConfigWriter
+    from utils.dataflow_config import DataFlowConfig
+    import getpass
+    import os
+    import sys
+
+    # Load configuration
+    if getattr(sys, 'frozen', False):
+        # If the application is run as a bundle (PyInstaller)
+        base_dir = os.path.dirname(sys.executable)
+    else:
+        # If run as a script
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+    config_path = os.path.join(base_dir, "DataFlowsConfig.xml")
+    config = DataFlowConfig.load(config_path)
+    SETTINGS = config.settings
+
+    # Define file paths
+    cache_path = os.path.join(base_dir, "RecordsCache.json.gz")
+    cache_db_path = os.path.join(base_dir, "RecordsCache.db")
+
+    # Generate a unique hash
+    crypto_services = CryptoServices()
+    
+    if reset:
+        # Delete RecordsCache.json.gz if it exists
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+            print("Deleted RecordsCache.json.gz file.")
+            logger.info("Deleted RecordsCache.json.gz file.")
+        # Delete the SQLite cache and its journal files if they exist
+        for path in (cache_db_path, cache_db_path + "-wal", cache_db_path + "-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+                print(f"Deleted {os.path.basename(path)} file.")
+                logger.info(f"Deleted {os.path.basename(path)} file.")
+        # Find and reset the delta_data setting
+        def reset_delta_data(root):
+            for setting in root.find('settings'):
+                if setting.attrib.get('key') == 'delta_data':
+                    setting.set('value', '')
+                    break
+        # Save the updated XML back to file
+        config = config.write(reset_delta_data)
+        print("Resetting delta_data setting to ''.")
+        logger.info("Resetting delta_data setting to ''.")
+        # Reset unique_hash when --reset flag is used
+        new_hash = crypto_services.generate_unique_hash(config=config)
+        print(f"Reset completed. New CMDB Hash: {new_hash}")
+        logger.info(f"Reset completed. New CMDB Hash: {new_hash}")
+        return
+    
+    # Initialize credentials management
+    service = SETTINGS["locker_service_name"]
+    credentials_manager = CredentialManager(service)
+    config_writer = ConfigWriter(config)
+
+    # Handle API credentials
+    if provide_credentials:
+        bigfix_username = input("Enter BigFix Master Operator Username: ")
+        bigfix_password = getpass.getpass("Enter BigFix Master Operator Password: ")
+        credentials_manager.add_credential(bigfix_username, bigfix_password)
+        config_writer.write_username(section="BigFixRestAPI", field="username", username=bigfix_username)
+
+        sx_username = input("Enter Service Exchange API Username: ")
+        sx_password = getpass.getpass("Enter Service Exchange API Password: ")
+        credentials_manager.add_credential(sx_username, sx_password)
+        sx_client_id = input("Enter Service Exchange API Client ID: ")
+        sx_client_secret = getpass.getpass("Enter Service Exchange API Client Secret: ")
+        credentials_manager.add_credential(sx_client_id, sx_client_secret)
+        config_writer.write_username(section="ServiceExchangeAPI", field="clientid", username=sx_client_id)
+        config_writer.write_username(section="ServiceExchangeAPI", field="username", username=sx_username)
+        return
+    
+    # Handle Proxy credentials
+    if provide_proxy_credentials:
+        bigfix_proxy_username = input("Enter BigFix Proxy Username: ")
+        bigfix_proxy_password = getpass.getpass("Enter BigFix Proxy Password: ")
+        credentials_manager.add_credential(bigfix_proxy_username, bigfix_proxy_password)
+        config_writer.write_username(section="BigFixRestAPI", field="proxyusername", username=bigfix_proxy_username)
+
+        sx_proxy_username = input("Enter Service Exchange Proxy Username: ")
+        sx_proxy_password = getpass.getpass("Enter Service Exchange Proxy Password: ")
+        credentials_manager.add_credential(sx_proxy_username, sx_proxy_password)
+        config_writer.write_username(section="ServiceExchangeAPI", field="proxyusername", username=sx_proxy_username)
+        return
+    
+    # Validate connections and build the handlers; init stops after the validation
+    context = load_context(config_path, check_site=not init)
+    if context is None:
+        return
+
+    try:
+        if not init:
+            run_dataflows(context, dataflow_filter)
+    finally:
+        context.cache.close()
+
+
 if __name__ == "__main__":
     import argparse
 
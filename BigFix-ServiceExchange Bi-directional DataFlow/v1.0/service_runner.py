@@ -2,18 +2,24 @@ import os
 import sys
 import re
 from datetime import timedelta
-import win32service
-import win32serviceutil
-import win32event
 import logging
-import xml.etree.ElementTree as ET
 from datetime import datetime, timedelta
 import argparse
-import winreg
-import servicemanager
 import time
-from threading import Thread
 from main import main
+from dataflow_engine import DataFlowEngine
+from utils.scheduler import DataFlowScheduler, dataflow_lock
+from utils.dataflow_config import DataFlowConfig
+
+try:
+    import win32service
+    import win32serviceutil
+    import win32event
+    import winreg
+    import servicemanager
+except ImportError:
+    # pywin32 is only available on Windows; the scheduler can still run in the foreground
+    win32service = win32serviceutil = win32event = winreg = servicemanager = None
 
 if getattr(sys, 'frozen', False):
     # If the application is run as a bundle (PyInstaller)
@@ -63,10 +69,14 @@ def get_main_script_path():
     logger.info(f"Resolved base path for main.py: {base_dir}")
     return os.path.join(base_dir, "main.py")
 
-def execute_main_script(dataflow_filter=None):
+def execute_main_script(dataflow_filter=None, engine=None):
     try:
         start_time = datetime.now()
-        main(dataflow_filter=dataflow_filter)
+        if engine is not None:
+            # Reuse the handlers, sessions and cache kept by the resident engine
+            engine.run(dataflow_filter=dataflow_filter)
+        else:
+            main(dataflow_filter=dataflow_filter)
         end_time = datetime.now()
         duration = (end_time - start_time).total_seconds()
         logger.info(f"Execution completed successfully.")
@@ -74,7 +84,73 @@ def execute_main_script(dataflow_filter=None):
     except Exception as e:
         logger.error(f"Error executing main function: {e}")
 
-class PythonWindowsService(win32serviceutil.ServiceFramework):
+def run_on_demand(dataflow_filter=None):
+    """
+    Run the dataflows now, or only dataflow_filter, holding the same lock files as the scheduler.
+    Returns False without running anything if one of the dataflows is already running.
+    """
+    names = [dataflow_filter] if dataflow_filter else sorted(load_schedules_from_config())
+    locks = []
+    try:
+        for name in names:
+            lock = dataflow_lock(base_dir, name)
+            if not lock.acquire(blocking=False):
+                logger.warning(f"Dataflow '{name}' is already running. Skipping the on-demand run.")
+                print(f"Dataflow '{name}' is already running. Try again once it has finished.")
+                return False
+            locks.append(lock)
+        execute_main_script(dataflow_filter=dataflow_filter)
+        return True
+    finally:
+        for lock in reversed(locks):
+            lock.release()
+
+def load_schedules_from_config():
+    try:
+        schedules = dict(DataFlowConfig.load(config_path).schedules)
+        logger.info(f"Loaded per-dataflow schedules: {schedules}")
+        return schedules
+    except Exception as e:
+        logger.error(f"Error loading dataflow schedules: {e}")
+        return {}
+
+def create_scheduler(engine):
+    """
+    Build the dataflow scheduler from the schedules and scheduler settings in the configuration.
+    """
+    settings = {}
+    try:
+        settings = DataFlowConfig.load(config_path).settings
+    except Exception as e:
+        logger.error(f"Error loading scheduler settings: {e}")
+    return DataFlowScheduler(
+        load_schedules_from_config(),
+        task=lambda dataflow_name: execute_main_script(dataflow_filter=dataflow_name, engine=engine),
+        max_concurrent=int(settings.get("scheduler_max_concurrent", 0)),
+        overlap_policy=settings.get("scheduler_overlap_policy", "skip"),
+        jitter_seconds=float(settings.get("scheduler_jitter_seconds", 0)),
+        lock_dir=base_dir
+    )
+
+def run_foreground():
+    """
+    Run the scheduled dataflows in the foreground until interrupted, without the Windows service.
+    """
+    engine = DataFlowEngine(config_path)
+    scheduler = create_scheduler(engine)
+    if not scheduler.next_run_times:
+        logger.error("No valid dataflow schedules found. Exiting.")
+        return
+    logger.info("Running scheduled dataflows in the foreground. Press Ctrl+C to stop.")
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        logger.info("Stop signal received.")
+        scheduler.stop()
+    finally:
+        engine.close()
+
+class PythonWindowsService(win32serviceutil.ServiceFramework if win32serviceutil else object):
     _svc_name_ = "BigFixDataFlowAdapter"
     _svc_display_name_ = "BigFix DataFlow Adapter"
     _svc_description_ = "Runs the BigFix-SX Adapter application as a service."
@@ -82,74 +158,20 @@ class PythonWindowsService(win32serviceutil.ServiceFramework):
     def __init__(self, args):
         super().__init__(args)
         self.hWaitStop = win32event.CreateEvent(None, 0, 0, None)
-        self.schedule = None
-        self.next_run_time = None
-        self.running_threads = []
-
-    def run_dataflow_in_thread(self, dataflow_name):
-        def task():
-            try:
-                logger.info(f"Started dataflow in thread: {dataflow_name}")
-                execute_main_script(dataflow_filter=dataflow_name)
-            except Exception as e:
-                logger.error(f"Dataflow '{dataflow_name}' failed: {e}")
-        thread = Thread(target=task, name=f"Dataflow-{dataflow_name}", daemon=True)
-        thread.start()
-        self.running_threads.append(thread)
-
-    def load_schedules_from_config(self):
-        try:
-            tree = ET.parse(config_path)
-            root = tree.getroot()
-            dataflows = root.findall(".//dataflows/dataflow")
-            schedules = {df.get("displayname"): df.get("schedule") for df in dataflows}
-            logger.info(f"Loaded per-dataflow schedules: {schedules}")
-            return schedules
-        except Exception as e:
-            logger.error(f"Error loading dataflow schedules: {e}")
-            return {}
-
-    def parse_iso8601_duration(self, duration_str):
-        pattern = (
-            r"P"
-            r"(?:(\d+)D)?"
-            r"(?:T"
-            r"(?:(\d+)H)?"
-            r"(?:(\d+)M)?"
-            r"(?:(\d+)S)?"
-            r")?"
-        )
-        match = re.fullmatch(pattern, duration_str)
-        if not match:
-            raise ValueError(f"Invalid ISO 8601 duration format: {self.schedule}")
-        days = int(match.group(1)) if match.group(1) else 0
-        hours = int(match.group(2)) if match.group(2) else 0
-        minutes = int(match.group(3)) if match.group(3) else 0
-        seconds = int(match.group(4)) if match.group(4) else 0
-        return timedelta(days=days, hours=hours, minutes=minutes, seconds=seconds)
-
-    def calculate_next_run_time(self, schedule):
-        try:
-            if schedule.lower() == "now":
-                return datetime.now()
-            else:
-                duration = self.parse_iso8601_duration(schedule)
-                return datetime.now() + duration
-        except Exception as e:
-            logger.error(f"Invalid schedule format: {schedule}. Error: {e}")
-            return None
+        self.engine = DataFlowEngine(config_path)
+        self.scheduler = None
+
+    def wait_for_stop(self, timeout):
+        return win32event.WaitForSingleObject(self.hWaitStop, int(timeout * 1000)) == win32event.WAIT_OBJECT_0
 
     def SvcDoRun(self):
         try:
             logger.info(">>> Entered SvcDoRun <<<")
-            self.dataflow_schedules = self.load_schedules_from_config()
-            if not self.dataflow_schedules:
+            self.scheduler = create_scheduler(self.engine)
+            if not self.scheduler.next_run_times:
                 logger.error("No valid dataflow schedules found. Exiting.")
                 return
 
-            self.schedule = next(iter(self.dataflow_schedules.values()))
-            logger.info(f"Default schedule set: {self.schedule}")
-
             self.ReportServiceStatus(win32service.SERVICE_START_PENDING)
             logger.info("Reported SERVICE_START_PENDING.")
 
@@ -161,31 +183,15 @@ class PythonWindowsService(win32serviceutil.ServiceFramework):
             self.ReportServiceStatus(win32service.SERVICE_RUNNING)
             logger.info("Service is now running.")
 
-            self.next_run_times = {
-                name: self.calculate_next_run_time(schedule)
-                for name, schedule in self.dataflow_schedules.items()
-            }
-
             formatted_times = {
-                name: dt.strftime("%Y-%m-%d %H:%M:%S") for name, dt in self.next_run_times.items()
+                name: dt.strftime("%Y-%m-%d %H:%M:%S") for name, dt in self.scheduler.next_run_times.items()
             }
             logger.info(f"Scheduled times: {formatted_times}")
-            execute_main_script()
-
-            while True:
-                result = win32event.WaitForSingleObject(self.hWaitStop, 1000)
-                if result == win32event.WAIT_OBJECT_0:
-                    logger.info("Stop signal received.")
-                    break
-
-                now = datetime.now()
-                for dataflow_name, next_run in self.next_run_times.items():
-                    if now >= next_run:
-                        logger.info(f"Starting dataflow thread: {dataflow_name}")
-                        self.run_dataflow_in_thread(dataflow_name)
-                        next_time = self.calculate_next_run_time(self.dataflow_schedules[dataflow_name])
-                        self.next_run_times[dataflow_name] = next_time
-                        logger.info(f"Next scheduled time for '{dataflow_name}': {next_time.strftime('%Y-%m-%d %H:%M:%S')}")
+
+            # Returns after the stop signal, once the running dataflows have finished
+            self.scheduler.run(wait_for_stop=self.wait_for_stop)
+            logger.info("Stop signal received.")
+            self.engine.close()
 
         except Exception as e:
             logger.error(f"Fatal error in SvcDoRun: {e}")
@@ -195,11 +201,6 @@ class PythonWindowsService(win32serviceutil.ServiceFramework):
         logger.info("Service is stopping.")
         self.ReportServiceStatus(win32service.SERVICE_STOP_PENDING)
         win32event.SetEvent(self.hWaitStop)
-        logger.info("Waiting for running threads to complete...")
-        for thread in self.running_threads:
-            if thread.is_alive():
-                thread.join()
-        logger.info("All threads completed.")
 
 if __name__ == "__main__":
     if len(sys.argv) > 1:
@@ -210,6 +211,7 @@ if __name__ == "__main__":
         parser.add_argument("--provideproxycredentials", action="store_true", help="Provide Proxy Credentials")
         parser.add_argument("--reset", action="store_true", help="Reset the CMDB hash in the XML config")
         parser.add_argument("--dataflow", type=str, help="Run a specific dataflow by display name")
+        parser.add_argument("--foreground", action="store_true", help="Run the scheduled dataflows in the foreground without the Windows service")
         parser.add_argument("action", nargs="?", choices=["install", "remove", "start", "stop", "restart"],
                             help="Service control actions (install, remove, start, stop, restart)", default=None)
         args = parser.parse_args()
@@ -233,8 +235,13 @@ if __name__ == "__main__":
                 logger.info("Schema initialization completed.")
             elif args.run:
                 logger.info("Dataflow job triggered on demand. Pipeline execution initiated.")
-                execute_main_script(dataflow_filter=args.dataflow)
+                run_on_demand(dataflow_filter=args.dataflow)
+            elif args.foreground:
+                run_foreground()
             elif args.action:
+                if win32serviceutil is None:
+                    print("Service actions require pywin32. Use --foreground to run the scheduler without the service.")
+                    sys.exit(1)
                 logger.info(f"Service action initiated: {args.action}")
                 win32serviceutil.HandleCommandLine(PythonWindowsService)
             else:
@@ -242,6 +249,8 @@ if __name__ == "__main__":
         except Exception as e:
             logger.error(f"Error: {e}")
             print(f"Error: {e}")
+    elif servicemanager is None:
+        print("The Windows service requires pywin32. Use --foreground to run the scheduler without the service.")
     else:
         servicemanager.Initialize()
         servicemanager.PrepareToHostSingle(PythonWindowsService)
@@ -1,6 +1,11 @@
 import requests
 import json
 import math
+import time
+import itertools
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlencode, urlparse, parse_qs, urlunparse
 import xml.etree.ElementTree as ET
 from logger import logger
@@ -8,12 +13,18 @@ import urllib3
 from datetime import datetime, timezone
 import isodate
 from utils.api_operations_template import APIRequest
+from utils.adaptive_batch import AdaptiveBatchSizer
+from utils import codec
 
 urllib3.disable_warnings()
 
+# Status values of the bulk endpoint that mark a page or a record as failed
+FAILED_STATUSES = frozenset({"error", "failed", "failure", "false"})
+# Characters of an upload response written to the log
+MAX_LOGGED_RESPONSE = 1000
 
 class SXAPIHandler:
-    def __init__(self, config_path, record_limit, base_url, username, password, proxy_url, proxy_username, proxy_password, verify, x_user_payload, sx_properties_sx_to_bf, delta):
+    def __init__(self, config_path, record_limit, base_url, username, password, proxy_url, proxy_username, proxy_password, verify, x_user_payload, sx_properties_sx_to_bf, delta, pool_size=10, max_in_flight=1, page_retries=0, retry_backoff=1.0, upload_workers=1, upload_target_seconds=0):
         self.config_path = config_path
         self.base_url = base_url
         self.headers = {
@@ -23,94 +34,143 @@ class SXAPIHandler:
         self.delta = delta
         self.username = username
         self.properties = sx_properties_sx_to_bf
+        self.property_plan = self.build_property_plan(sx_properties_sx_to_bf)
         self.password = password
         self.auth = (username, password)
         self.record_limit = record_limit
         self.verify = verify
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.page_retries = int(page_retries)
+        self.retry_backoff = retry_backoff
+        self.upload_workers = max(1, int(upload_workers))
+        self.upload_target_seconds = upload_target_seconds
         self.APIRequestHandler = APIRequest(
             base_url=base_url,
             proxy_url=proxy_url,
             proxy_username=proxy_username,
-            proxy_password=proxy_password
+            proxy_password=proxy_password,
+            pool_size=pool_size
         )
 
     def get_computer_data(self):
         """Fetch all computer details from SX."""
         try:
-            logger.info(f"Fetching all computer details from SX API.")
-
-            # Initialize variables for pagination
-            all_data = []
-            current_page = 1
-            limit = self.record_limit
-
-            # Add technical attributes to headers
-            self.headers['fetchattribute'] = 'true'
-            
-            # Parse the base URL and query parameters
-            endpoint = "/cmdb/api/config_items/v2"
-            params = {"page": 1, "limit": limit}
-
-            # Add header for delta data
-            if self.delta is not None:
-                now = datetime.now(timezone.utc)
-                delta = isodate.parse_duration(self.delta)
-                start = now - delta
-                # Format: MM-DD-YYYY
-                start_str = start.strftime("%m-%d-%Y")
-                end_str = now.strftime("%m-%d-%Y")
-                # Create JSON string for header
-                revamp_dict = {
-                    "updated_at": f"{start_str}&{end_str}"
-                }
-                revamp_header = json.dumps(revamp_dict)  # Makes it a valid JSON string
-                # Add it to headers
-                self.headers['revamp'] = revamp_header
+            all_data = list(self.iter_computer_data())
+            print(all_data)
+            return all_data
+        except requests.RequestException as e:
+            logger.error(f"Error fetching SX computer data: {e}")
+            return None
 
-            while True:
-                # Update the query parameters for pagination
-                params['page'] = [current_page]
+    def iter_computer_data(self, full=False):
+        """
+        Fetch computer details from SX page by page, yielding parsed records as each page arrives
+        so callers can process the CMDB without holding every page in memory.
 
-                # Make the API request
+        :param full: Fetch every CI even if delta data is configured (default is False).
+        """
+        logger.info(f"Fetching all computer details from SX API.")
+
+        # Initialize variables for pagination
+        record_count = 0
+        current_page = 1
+        limit = self.record_limit
+
+        # Add technical attributes to headers
+        self.headers['fetchattribute'] = 'true'
+
+        # Parse the base URL and query parameters
+        endpoint = "/cmdb/api/config_items/v2"
+        params = {"page": 1, "limit": limit}
+
+        # Add header for delta data
+        if self.delta is not None and not full:
+            now = datetime.now(timezone.utc)
+            delta = isodate.parse_duration(self.delta)
+            start = now - delta
+            # Format: MM-DD-YYYY
+            start_str = start.strftime("%m-%d-%Y")
+            end_str = now.strftime("%m-%d-%Y")
+            # Create JSON string for header
+            revamp_dict = {
+                "updated_at": f"{start_str}&{end_str}"
+            }
+            revamp_header = json.dumps(revamp_dict)  # Makes it a valid JSON string
+            # Add it to headers
+            self.headers['revamp'] = revamp_header
+
+        # The first page tells how many pages there are
+        page_data, meta = self.fetch_page(endpoint, params, current_page, full)
+        record_count += len(page_data)
+        total_pages = meta.get('totalPageCount', 1)
+        current_page = meta.get('currentPage', current_page)
+        logger.info(f"Fetched page {current_page}/{total_pages}.")
+        yield from page_data
+
+        if self.max_in_flight <= 1:
+            for page in range(current_page + 1, total_pages + 1):
+                page_data, _ = self.fetch_page(endpoint, params, page, full)
+                record_count += len(page_data)
+                logger.info(f"Fetched page {page}/{total_pages}.")
+                yield from page_data
+        else:
+            # Prefetch the remaining pages with a bounded pool and hand them out in page order.
+            # At most twice max_in_flight pages are requested or buffered at any time.
+            logger.info(f"Prefetching {total_pages - current_page} pages with {self.max_in_flight} concurrent requests.")
+            remaining_pages = iter(range(current_page + 1, total_pages + 1))
+            pending = collections.deque()
+            with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="SXFetch") as executor:
+                try:
+                    for page in itertools.islice(remaining_pages, self.max_in_flight * 2):
+                        pending.append((page, executor.submit(self.fetch_page, endpoint, params, page, full)))
+                    while pending:
+                        page, future = pending.popleft()
+                        page_data, _ = future.result()
+                        for next_page in itertools.islice(remaining_pages, 1):
+                            pending.append((next_page, executor.submit(self.fetch_page, endpoint, params, next_page, full)))
+                        record_count += len(page_data)
+                        logger.info(f"Fetched page {page}/{total_pages}.")
+                        yield from page_data
+                finally:
+                    # Stop outstanding requests if the consumer stops early or a page failed
+                    for _, future in pending:
+                        future.cancel()
+
+        logger.info(f"Fetched {record_count} computer records from SX API.")
+
+    def fetch_page(self, endpoint, params, page, full=False):
+        """
+        Fetch and parse a single page of computer details, retrying failed requests with backoff.
+        Returns the parsed records and the page metadata.
+
+        :param full: Request the page without the delta data filter (default is False).
+        """
+        page_params = dict(params, page=[page])
+        headers = self.headers
+        if full and 'revamp' in headers:
+            headers = {key: value for key, value in headers.items() if key != 'revamp'}
+        for attempt in range(self.page_retries + 1):
+            try:
                 response = self.APIRequestHandler.request(
                     method="GET",
                     endpoint=endpoint,
-                    params=params,
+                    params=page_params,
                     username=self.username,
                     password=self.password,
-                    headers=self.headers,
+                    headers=headers,
                     verify=self.verify
                 )
                 response.raise_for_status()
 
                 # Parse the JSON response
-                response_json = response.json()
-                
-                # Extract the data from the current page
-                page_data = self.parse_computer_details(response_json)
-                all_data.extend(page_data)
-
-                # Extract metadata to handle pagination
-                meta = response_json.get('meta', {})
-                total_pages = meta.get('totalPageCount', 1)
-                current_page = meta.get('currentPage', current_page)
-
-                # Log progress
-                logger.info(f"Fetched page {current_page}/{total_pages}.")
-
-                # Check if we've fetched all pages
-                if current_page >= total_pages:
-                    break
-
-                # Move to the next page
-                current_page += 1
-
-            logger.info(f"Fetched {len(all_data)} computer records from SX API.")
-            print(all_data)
-            return all_data
-        except requests.RequestException as e:
-            logger.error(f"Error fetching SX computer data: {e}")
-            return None
+                response_json = codec.loads(response.content)
+                return self.parse_computer_details(response_json, full), response_json.get('meta', {})
+            except (RuntimeError, ValueError, requests.RequestException) as e:
+                if attempt >= self.page_retries:
+                    raise
+                wait = self.retry_backoff * (2 ** attempt)
+                logger.warning(f"Fetching SX page {page} failed (attempt {attempt + 1}): {e}. Retrying in {wait:.1f} seconds.")
+                time.sleep(wait)
 
     def validate_connection(self):
         """Validating Connection to ServiceExchange."""
@@ -143,10 +203,10 @@ class SXAPIHandler:
             for key in keys:
                 # Recursively parse stringified JSON if needed
                 while isinstance(value, str):
-                    try:
-                        value = json.loads(value)
-                    except json.JSONDecodeError:
+                    parsed = codec.loads_nested(value)
+                    if parsed is codec.NOT_JSON:
                         break  # Exit if it's just a regular string
+                    value = parsed
 
                 if isinstance(value, dict):
                     value = value.get(key)
@@ -161,35 +221,61 @@ class SXAPIHandler:
             logger.warning(f"Error extracting '{property_path}': {e}")
             return None
     
-    def parse_computer_details(self, response_json):
+    @staticmethod
+    def build_property_plan(properties):
+        """
+        Precompute the (property name, type) pairs read from every CI and the
+        attribute and tag names to pick from the CI attribute and tag lists.
+        """
+        plan = tuple((prop_info.get("propertyname"), prop_info.get("type")) for prop_info in (properties or {}).values())
+        attribute_names = frozenset(propertyname for propertyname, proptype in plan if proptype == "technical")
+        tag_names = frozenset(propertyname for propertyname, proptype in plan if proptype == "custom")
+        return plan, attribute_names, tag_names
+
+    @staticmethod
+    def index_values(items, name_key, value_key, names):
+        """
+        Index the values of the wanted names in a list of {name_key, value_key} items in one pass.
+        The first occurrence of a name wins and the scan stops once every name was found.
+        """
+        index = {}
+        if not names:
+            return index
+        remaining = len(names)
+        for item in items or []:
+            name = item.get(name_key)
+            if name in names and name not in index:
+                index[name] = item.get(value_key)
+                remaining -= 1
+                if not remaining:
+                    break
+        return index
+
+    def parse_computer_details(self, response_json, full=False):
         """Parse all computer details from API response using self.properties."""
-        if self.delta is None:
+        if self.delta is None or full:
             data = response_json.get('data', [])
         else:
             data = response_json.get('result', [])
 
+        plan, attribute_names, tag_names = self.property_plan
         processed_data = []
 
         for computer in data:
-            entry = {}
-            for display_name, prop_info in self.properties.items():
-                propertyname = prop_info.get("propertyname")
-                proptype = prop_info.get("type")
+            # Index the configured attributes and tags once per CI instead of scanning the lists per property
+            attributes = self.index_values(computer.get("ATTRIBUTE"), "attribute_name", "attr_value", attribute_names)
+            tags = self.index_values((computer.get("TAG") or {}).get("tag_data"), "tag_name", "tag_value", tag_names)
 
+            entry = {}
+            for propertyname, proptype in plan:
                 value = None
 
                 if proptype == "general":
                     value = computer.get(propertyname)
                 elif proptype == "technical":
-                    for attr in computer.get("ATTRIBUTE", []):
-                        if attr.get("attribute_name") == propertyname:
-                            value = attr.get("attr_value")
-                            break
+                    value = attributes.get(propertyname)
                 elif proptype == "custom":
-                    for tag in computer.get("TAG", {}).get("tag_data", []):
-                        if tag.get("tag_name") == propertyname:
-                            value = tag.get("tag_value")
-                            break
+                    value = tags.get(propertyname)
 
                 # Flatten lists and ensure strings
                 if isinstance(value, list):
@@ -204,42 +290,150 @@ class SXAPIHandler:
         return processed_data
 
     def post_computer_details(self, device_data_list):
-        record_limit_per_page = int(self.record_limit)
+        """
+        Upload device records to SX in pages posted by upload_workers concurrent workers.
+        Page sizes start at the record limit and are tuned to the server's response time.
+        Returns the positions in device_data_list of records that could not be uploaded or were rejected by SX.
+
+        The page meta follows the actual plan: pages are numbered 1..n in record order, currentCount is
+        the size of the page and totalCount the number of records. Without tuning every page holds
+        record_limit records, as in a sequential upload. The last page is posted only after all other
+        pages completed, so the server sees it last.
+        """
         total_records = len(device_data_list)
-        total_pages = math.ceil(total_records / record_limit_per_page)
-
-        for current_page in range(1, total_pages + 1):
-            start_idx = (current_page - 1) * record_limit_per_page
-            end_idx = min(start_idx + record_limit_per_page, total_records)
-
-            payload = {
-                'meta': {
-                    'pushToCMDB': 'yes',
-                    'currentCount': end_idx - start_idx,
-                    'totalCount': total_records,
-                    'currentPage': current_page
-                },
-                'data': device_data_list[start_idx:end_idx]
-            }
+        batch_sizer = AdaptiveBatchSizer(int(self.record_limit), min_size=10, target_seconds=self.upload_target_seconds)
+        lock = threading.Condition()
+        cursor = {"next_index": 0, "page": 0, "in_flight": 0}
+        failed_positions = []
+
+        def claim_page():
+            with lock:
+                if cursor["next_index"] >= total_records:
+                    return None
+                start_idx = cursor["next_index"]
+                end_idx = min(start_idx + batch_sizer.next_size(), total_records)
+                cursor["next_index"] = end_idx
+                cursor["page"] += 1
+                cursor["in_flight"] += 1
+                return cursor["page"], start_idx, end_idx
+
+        def upload_worker():
+            while True:
+                page = claim_page()
+                if page is None:
+                    return
+                current_page, start_idx, end_idx = page
+                if end_idx == total_records:
+                    with lock:
+                        lock.wait_for(lambda: cursor["in_flight"] == 1)
+                failed_offsets = range(end_idx - start_idx)
+                try:
+                    started = time.monotonic()
+                    failed_offsets = self.post_page(device_data_list[start_idx:end_idx], current_page, total_records)
+                    if len(failed_offsets) < end_idx - start_idx:
+                        batch_sizer.record(end_idx - start_idx, time.monotonic() - started)
+                finally:
+                    with lock:
+                        failed_positions.extend(start_idx + offset for offset in failed_offsets)
+                        cursor["in_flight"] -= 1
+                        lock.notify_all()
+
+        workers = max(1, min(self.upload_workers, total_records))
+        if workers == 1:
+            upload_worker()
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="SXUpload") as executor:
+                for future in [executor.submit(upload_worker) for _ in range(workers)]:
+                    future.result()
 
-            json_payload = json.dumps(payload, indent=4)
-            print(json_payload)
-            logger.info(json_payload)
+        logger.info(f"Uploaded {total_records - len(failed_positions)}/{total_records} records to SX in {cursor['page']} pages.")
+        if failed_positions:
+            logger.error(f"{len(failed_positions)} records could not be uploaded to SX.")
+        return sorted(failed_positions)
 
-            endpoint = '/cmdb/api/integration/bulk'
-            response_post = self.APIRequestHandler.request(
-                method='POST',
-                endpoint=endpoint,
-                data=json_payload,
-                username=self.username,
-                password=self.password,
-                headers=self.headers,
-                verify=self.verify
-            )
+    def post_page(self, page_records, current_page, total_records):
+        """
+        Post one page of device records, retrying failed requests with backoff.
+        Returns the offsets within the page of records that were not accepted; empty if the whole page was.
+        """
+        payload = {
+            'meta': {
+                'pushToCMDB': 'yes',
+                'currentCount': len(page_records),
+                'totalCount': total_records,
+                'currentPage': current_page
+            },
+            'data': page_records
+        }
+        json_payload = codec.dumps(payload)
 
-            print(f'Page {current_page}/{total_pages} - Status Code: {response_post.status_code}')
-            logger.info(f'Page {current_page}/{total_pages} - Status Code: {response_post.status_code}')
-            print(response_post.text)
-            logger.info(response_post.text)
+        endpoint = '/cmdb/api/integration/bulk'
+        for attempt in range(self.page_retries + 1):
+            try:
+                response_post = self.APIRequestHandler.request(
+                    method='POST',
+                    endpoint=endpoint,
+                    data=json_payload,
+                    username=self.username,
+                    password=self.password,
+                    headers=self.headers,
+                    verify=self.verify
+                )
+                print(f'Page {current_page} ({len(page_records)} records) - Status Code: {response_post.status_code}')
+                logger.info(f'Page {current_page} ({len(page_records)} records) - Status Code: {response_post.status_code}')
+                logger.info(response_post.text[:MAX_LOGGED_RESPONSE])
+                failed_offsets = self.failed_record_offsets(response_post.content, len(page_records))
+                if failed_offsets:
+                    logger.error(f"SX rejected {len(failed_offsets)} of {len(page_records)} records of page {current_page}.")
+                return failed_offsets
+            except (RuntimeError, requests.RequestException) as e:
+                if attempt >= self.page_retries:
+                    logger.error(f"Failed to upload page {current_page} to SX: {e}")
+                    return list(range(len(page_records)))
+                wait = self.retry_backoff * (2 ** attempt)
+                logger.warning(f"Uploading page {current_page} failed (attempt {attempt + 1}): {e}. Retrying in {wait:.1f} seconds.")
+                time.sleep(wait)
+
+    @staticmethod
+    def failed_record_offsets(response_content, page_size):
+        """
+        Return the offsets of the records the bulk endpoint reports as failed.
+        - A top-level failure status ("status" of failure/error/false, or "success": false) fails the whole page.
+        - Per-record results in "result" or "data" are aligned with the posted records; entries with a
+          failure status fail their record.
+        - Entries of "errors" or "failed_records" name the failed record by "index"; entries without
+          an index fail the whole page, since the record cannot be identified.
+        Bodies that are not JSON objects carry no per-record results and leave the page accepted.
+        """
+        try:
+            response_json = codec.loads(response_content) if response_content else None
+        except codec.JSONDecodeError:
+            return []
+        if not isinstance(response_json, dict):
+            return []
 
-        return
\ No newline at end of file
+        def is_failure(item):
+            status = item.get("status")
+            if isinstance(status, str):
+                return status.strip().lower() in FAILED_STATUSES
+            return status is False or item.get("success") is False
+
+        all_offsets = list(range(page_size))
+        if is_failure(response_json):
+            return all_offsets
+
+        failed = set()
+        for key in ("result", "data"):
+            results = response_json.get(key)
+            if isinstance(results, list):
+                failed.update(offset for offset, item in enumerate(results[:page_size]) if isinstance(item, dict) and is_failure(item))
+        for key in ("errors", "failed_records"):
+            errors = response_json.get(key)
+            if not errors or not isinstance(errors, list):
+                continue
+            for error in errors:
+                index = error.get("index") if isinstance(error, dict) else None
+                if not isinstance(index, int) or not 0 <= index < page_size:
+                    return all_offsets
+                failed.add(index)
+        return sorted(failed)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules import each other from the application directory, as main.py and service_runner.py do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,28 @@
+import pytest
+import requests
+from utils.api_operations_template import APIRequest
+
+
+class FakeResponse(requests.Response):
+    def __init__(self, status_code):
+        super().__init__()
+        self.status_code = status_code
+        self.url = "https://bigfix.example:52311/api/computers"
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def test_failed_streamed_response_is_closed(monkeypatch, stream):
+    response = FakeResponse(503)
+    api = APIRequest(base_url="https://bigfix.example:52311")
+    monkeypatch.setattr(api.session, "request", lambda **kwargs: response)
+
+    with pytest.raises(RuntimeError) as error:
+        api.request("GET", "/api/computers", stream=stream)
+
+    assert response.closed is stream
+    assert error.value.__cause__.response.status_code == 503
+
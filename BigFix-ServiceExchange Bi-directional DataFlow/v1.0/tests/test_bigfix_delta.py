@@ -0,0 +1,119 @@
+import pytest
+import bigfix_data_operations.api_handler as api_handler
+from bigfix_data_operations.api_handler import BigFixAPIHandler
+from utils.manage_cache import CacheManager
+
+# Shape of a BigFix /api/computers response
+COMPUTERS_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<BESAPI xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:noNamespaceSchemaLocation="BESAPI.xsd">
+	<Computer Resource="https://bigfix.example:52311/api/computer/1">
+		<LastReportTime>Tue, 01 Apr 2025 10:00:00 +0000</LastReportTime>
+		<ID>1</ID>
+	</Computer>
+	<Computer Resource="https://bigfix.example:52311/api/computer/2">
+		<LastReportTime>Tue, 01 Apr 2025 11:30:00 +0000</LastReportTime>
+		<ID>2</ID>
+	</Computer>
+</BESAPI>
+"""
+
+
+@pytest.fixture
+def handler(tmp_path):
+    cache = CacheManager(str(tmp_path / "RecordsCache.json.gz"))
+    return BigFixAPIHandler(
+        config_path=None, base_url="https://bigfix.example:52311", username="user", password="password",
+        proxy_url=None, proxy_username=None, proxy_password=None, verify=False,
+        bigfix_properties_sx_to_bf={"BigFix Computer Name": {"propertyname": "Computer Name", "type": "general"}},
+        delta_mode=True, cache=cache
+    )
+
+
+def run_delta(handler, report_times, details):
+    """Run a delta fetch against fixed report times; returns the result and the IDs that were fetched."""
+    fetched_ids = []
+
+    def fetch_computers(computer_ids=None):
+        fetched_ids.extend(computer_ids)
+        return [details[computer_id] for computer_id in computer_ids if computer_id in details]
+
+    handler.get_computer_report_times = lambda: report_times
+    handler.fetch_computers = fetch_computers
+    return handler.get_computer_data_delta(), fetched_ids
+
+
+def test_parse_report_times_reads_child_elements(handler):
+    assert handler.parse_report_times_from_xml(COMPUTERS_XML) == [
+        ("1", "Tue, 01 Apr 2025 10:00:00 +0000"),
+        ("2", "Tue, 01 Apr 2025 11:30:00 +0000"),
+    ]
+
+
+def test_parse_ids_does_not_keep_parsed_computers(handler, monkeypatch):
+    roots = []
+    iterparse = api_handler.codec.iterparse
+
+    def recording_iterparse(source, events):
+        for event, element in iterparse(source, events=events):
+            if not roots:
+                roots.append(element)
+            yield event, element
+
+    monkeypatch.setattr(api_handler.codec, "iterparse", recording_iterparse)
+
+    assert handler.parse_ids_from_xml(COMPUTERS_XML) == ["1", "2"]
+    assert len(roots[0]) == 0
+
+
+def test_unchanged_computers_are_served_from_the_cache(handler):
+    report_times = handler.parse_report_times_from_xml(COMPUTERS_XML)
+    details = {"1": {"ID": "1", "Computer Name": "host1"}, "2": {"ID": "2", "Computer Name": "host2"}}
+    first, fetched = run_delta(handler, report_times, details)
+    assert fetched == ["1", "2"]
+    assert first == [details["1"], details["2"]]
+
+    # Computer 2 reported again; only it is fetched
+    report_times = [report_times[0], ("2", "Tue, 01 Apr 2025 12:00:00 +0000")]
+    details["2"] = {"ID": "2", "Computer Name": "host2-renamed"}
+    second, fetched = run_delta(handler, report_times, details)
+    assert fetched == ["2"]
+    assert second == [{"ID": "1", "Computer Name": "host1"}, {"ID": "2", "Computer Name": "host2-renamed"}]
+
+
+def test_missing_report_time_is_always_fetched(handler):
+    details = {"1": {"ID": "1", "Computer Name": "host1"}}
+    run_delta(handler, [("1", None)], details)
+    _, fetched = run_delta(handler, [("1", None)], details)
+    assert fetched == ["1"]
+
+
+def test_removed_computers_are_dropped(handler):
+    details = {"1": {"ID": "1"}, "2": {"ID": "2"}}
+    run_delta(handler, [("1", "t1"), ("2", "t1")], details)
+    result, fetched = run_delta(handler, [("1", "t1")], details)
+    assert fetched == []
+    assert result == [{"ID": "1"}]
+    assert set(handler.cache.get_records("bf_snapshot")) == {"1"}
+
+
+def test_failed_computer_keeps_its_previous_record(handler):
+    details = {"1": {"ID": "1", "Computer Name": "host1"}, "2": {"ID": "2", "Computer Name": "host2"}}
+    run_delta(handler, [("1", "t1"), ("2", "t1")], details)
+
+    # Per-computer fetch where the request for computer 2 fails
+    def request_xml(parse, method, endpoint, **kwargs):
+        computer_id = endpoint.rsplit("/", 1)[-1]
+        if computer_id == "2":
+            raise RuntimeError("An error occurred during the request: 503 Server Error")
+        return {"ID": computer_id, "Computer Name": f"host{computer_id}-new"}
+
+    handler.request_xml = request_xml
+    handler.get_computer_report_times = lambda: [("1", "t2"), ("2", "t2")]
+    del handler.fetch_computers
+    result = handler.get_computer_data_delta()
+
+    assert result == [{"ID": "1", "Computer Name": "host1-new"}, {"ID": "2", "Computer Name": "host2"}]
+    stored = handler.cache.get_records("bf_snapshot")
+    assert stored["1"]["last_report_time"] == "t2"
+    # The old watermark is kept, so computer 2 is fetched again on the next run
+    assert stored["2"]["last_report_time"] == "t1"
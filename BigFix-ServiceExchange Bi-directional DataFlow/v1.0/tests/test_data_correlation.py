@@ -0,0 +1,45 @@
+from data_correlation.data_correlation import DataCorrelation
+
+IDENTITY_PROPERTIES = {
+    "bigfix": {"BigFix Computer Name": "Computer Name", "IP Address": "IP Address", "MAC Address": "MAC Address"},
+    "sx": {"CI Name": "CI_NAME", "IP Address": "IP_ADDRESS", "MAC Address": "MAC_ADDRESS"},
+}
+# Weights and threshold shipped in DataFlowsConfig.xml
+IDENTITY_WEIGHTS = {
+    "bigfix": {"BigFix Computer Name": None, "IP Address": 20, "MAC Address": 20},
+    "sx": {"CI Name": None, "IP Address": 20, "MAC Address": 20},
+}
+BIGFIX_PROPERTIES = {"BigFix Computer ID": "ID"}
+SX_PROPERTIES = {"CI ID": "CI_ID"}
+
+
+def correlate_weighted(bigfix_data, sx_data, default_weight=None):
+    return DataCorrelation.correlate(
+        bigfix_data=bigfix_data, sx_data=sx_data, bigfix_properties=BIGFIX_PROPERTIES, sx_properties=SX_PROPERTIES,
+        identity_properties=IDENTITY_PROPERTIES, identity_weights=IDENTITY_WEIGHTS, minimum_confidence=40, default_weight=default_weight
+    )
+
+
+def test_shared_ip_alone_does_not_match():
+    bigfix_data = [{"BigFix Computer ID": "1", "BigFix Computer Name": "web-01", "IP Address": "10.0.0.5", "MAC Address": "aa:aa:aa:aa:aa:01"}]
+    sx_data = [{"CI ID": "CI-1", "CI Name": "db-07", "IP Address": "10.0.0.5", "MAC Address": "bb:bb:bb:bb:bb:07"}]
+
+    assert correlate_weighted(bigfix_data, sx_data) == []
+
+
+def test_ip_and_mac_together_match():
+    bigfix_data = [{"BigFix Computer ID": "1", "BigFix Computer Name": "web-01", "IP Address": "10.0.0.5", "MAC Address": "AA:AA:AA:AA:AA:01"}]
+    sx_data = [
+        {"CI ID": "CI-1", "CI Name": "db-07", "IP Address": "10.0.0.5", "MAC Address": "bb:bb:bb:bb:bb:07"},
+        {"CI ID": "CI-2", "CI Name": "web-01-old", "IP Address": "10.0.0.5, 10.0.1.5", "MAC Address": "aa:aa:aa:aa:aa:01"},
+    ]
+
+    assert correlate_weighted(bigfix_data, sx_data) == [{"BigFix Computer ID": "1", "CI ID": "CI-2"}]
+
+
+def test_unweighted_property_counts_the_threshold_by_default():
+    bigfix_data = [{"BigFix Computer ID": "1", "BigFix Computer Name": "web-01", "IP Address": "10.0.0.5", "MAC Address": ""}]
+    sx_data = [{"CI ID": "CI-1", "CI Name": "WEB-01", "IP Address": "10.0.9.9", "MAC Address": ""}]
+
+    assert correlate_weighted(bigfix_data, sx_data) == [{"BigFix Computer ID": "1", "CI ID": "CI-1"}]
+    assert correlate_weighted(bigfix_data, sx_data, default_weight=20) == []
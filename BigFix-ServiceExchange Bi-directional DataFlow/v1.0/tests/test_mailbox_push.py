@@ -0,0 +1,100 @@
+import threading
+import pytest
+from mailbox_records.manage_mailbox_records import MailboxManager
+from utils.manage_cache import CacheManager
+
+HASH = "abc123"
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, text=""):
+        self.status_code = status_code
+        self.text = text
+
+
+class FakeMailboxAPI:
+    """In-memory BigFix mailbox API: {computer ID: {file ID: file name}}."""
+    def __init__(self, failing_computers=()):
+        self.mailboxes = {}
+        self.failing_computers = set(failing_computers)
+        self.calls = []
+        self.lock = threading.Lock()
+        self.next_id = 0
+
+    def request(self, method, endpoint, headers=None, **kwargs):
+        parts = endpoint.strip("/").split("/")
+        computer_id = parts[2]
+        with self.lock:
+            self.calls.append((method, computer_id))
+            files = self.mailboxes.setdefault(computer_id, {})
+            if method == "GET":
+                entries = "".join(f"<ComputerMailboxFile><ID>{file_id}</ID><Name>{name}</Name></ComputerMailboxFile>" for file_id, name in files.items())
+                return FakeResponse(text=f"<BESAPI>{entries}</BESAPI>")
+            if method == "DELETE":
+                files.pop(parts[3], None)
+                return FakeResponse()
+            if computer_id in self.failing_computers:
+                raise RuntimeError("An error occurred during the request: 500 Server Error")
+            self.next_id += 1
+            files[str(self.next_id)] = headers["Content-Disposition"].split('filename="')[1].rstrip('"')
+            return FakeResponse()
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = MailboxManager("https://bigfix.example:52311", "user", "password", HASH, cache=CacheManager(str(tmp_path / "RecordsCache.json.gz")))
+    manager.APIRequestHandler = FakeMailboxAPI()
+    return manager
+
+
+def payloads(count, version="v1"):
+    return [(str(computer_id), f"{computer_id},{version}") for computer_id in range(1, count + 1)]
+
+
+def test_concurrent_push_replaces_each_mailbox_file(manager):
+    api = manager.APIRequestHandler
+    manager.push_files(payloads(20), max_workers=8)
+
+    results = manager.push_files(payloads(20, "v2"), max_workers=8)
+
+    assert results == {str(computer_id): "pushed" for computer_id in range(1, 21)}
+    for computer_id in range(1, 21):
+        (name,) = api.mailboxes[str(computer_id)].values()
+        assert name == manager.file_name(computer_id, manager.payload_digest(f"{computer_id},v2"))
+
+
+def test_unchanged_payloads_are_not_sent_again(manager):
+    api = manager.APIRequestHandler
+    manager.push_files(payloads(5), max_workers=4)
+    api.calls.clear()
+
+    results = manager.push_files(payloads(5), max_workers=4)
+
+    assert set(results.values()) == {"unchanged"}
+    assert api.calls == []
+
+
+def test_identical_mailbox_file_is_kept_without_a_cached_digest(manager, tmp_path):
+    api = manager.APIRequestHandler
+    manager.push_files(payloads(3))
+    # A fresh cache, e.g. after --reset, only has the mailbox to compare with
+    manager.cache = CacheManager(str(tmp_path / "Fresh.json.gz"))
+    api.calls.clear()
+
+    results = manager.push_files(payloads(3))
+
+    assert set(results.values()) == {"unchanged"}
+    assert {method for method, _ in api.calls} == {"GET"}
+
+
+def test_failed_computer_is_retried_on_the_next_run(manager):
+    api = manager.APIRequestHandler
+    api.failing_computers = {"2"}
+
+    results = manager.push_files(payloads(3), max_workers=3)
+
+    assert results == {"1": "pushed", "2": "failed", "3": "pushed"}
+    assert set(manager.cache.get_records("mailbox_digests")) == {"1", "3"}
+
+    api.failing_computers = set()
+    assert manager.push_files(payloads(3), max_workers=3) == {"1": "unchanged", "2": "pushed", "3": "unchanged"}
@@ -0,0 +1,151 @@
+import os
+import pytest
+from utils.manage_cache import CacheManager, SQLiteCacheManager
+
+RECORDS = [
+    {"CI ID": "1", "CI Name": "web-01", "IP Address": "10.0.0.1"},
+    {"CI ID": "2", "CI Name": "web-02", "IP Address": "10.0.0.2"},
+    {"CI ID": "3", "CI Name": "db-01", "IP Address": "10.0.0.3"},
+]
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def cache(request, tmp_path):
+    if request.param == "sqlite":
+        cache = SQLiteCacheManager(str(tmp_path / "RecordsCache.db"))
+    else:
+        cache = CacheManager(str(tmp_path / "RecordsCache.json.gz"))
+    yield cache
+    cache.close()
+
+
+def keyed(records):
+    return ((record["CI ID"], record) for record in records)
+
+
+def test_first_run_reports_every_record_as_inserted(cache):
+    changes = cache.detect_changes("sx_to_bf", keyed(RECORDS))
+
+    assert changes.inserted == RECORDS
+    assert changes.changed_ids == ["1", "2", "3"]
+    assert changes.updated == [] and changes.deleted == []
+
+
+def test_changed_and_removed_records_are_detected_across_runs(cache):
+    cache.detect_changes("sx_to_bf", keyed(RECORDS))
+    cache.flush()
+
+    reloaded = type(cache)(cache.filename)
+    updated = dict(RECORDS[1], **{"IP Address": "10.0.1.2"})
+    changes = reloaded.detect_changes("sx_to_bf", keyed([RECORDS[0], updated]))
+
+    assert changes.inserted == []
+    assert changes.updated == [updated]
+    assert changes.changed_ids == ["2"]
+    assert changes.deleted == ["3"]
+    assert set(reloaded.get_records("sx_to_bf")) == {"1", "2"}
+
+
+def test_partial_view_keeps_absent_records(cache):
+    cache.detect_changes("sx_to_bf", keyed(RECORDS))
+
+    changes = cache.detect_changes("sx_to_bf", keyed(RECORDS[:1]), complete=False)
+
+    assert changes.changed == [] and changes.deleted == []
+    assert set(cache.get_records("sx_to_bf")) == {"1", "2", "3"}
+
+
+def test_forgotten_records_are_reported_again(cache):
+    cache.detect_changes("sx_to_bf", keyed(RECORDS))
+    cache.forget_records("sx_to_bf", ["2"])
+
+    assert cache.detect_changes("sx_to_bf", keyed(RECORDS)).changed_ids == ["2"]
+
+
+@pytest.mark.parametrize("legacy", [
+    RECORDS[:2],
+    {"sx_data": RECORDS[:2]},
+], ids=["record list", "sx_data"])
+def test_legacy_record_list_is_migrated_by_content(cache, legacy):
+    cache.save_to_cache("sx_to_bf", legacy)
+
+    changes = cache.detect_changes("sx_to_bf", keyed(RECORDS))
+
+    # Records cached by earlier versions are not sent again; the legacy key is replaced by the index
+    assert changes.changed == [RECORDS[2]]
+    assert cache.load_from_cache("sx_to_bf") is None
+    assert set(cache.get_records("sx_to_bf")) == {"1", "2", "3"}
+
+
+def test_legacy_single_key_index_is_migrated(cache):
+    index = {record["CI ID"]: CacheManager.record_hash(record) for record in RECORDS}
+    cache.save_to_cache("sx_to_bf", {"index": index})
+
+    changes = cache.detect_changes("sx_to_bf", keyed(RECORDS))
+
+    assert changes.changed == []
+    assert cache.load_from_cache("sx_to_bf") is None
+    assert cache.get_records("sx_to_bf") == index
+
+
+def test_sqlite_imports_the_json_cache_once(tmp_path):
+    json_path = str(tmp_path / "RecordsCache.json.gz")
+    db_path = str(tmp_path / "RecordsCache.db")
+    json_cache = CacheManager(json_path)
+    json_cache.detect_changes("sx_to_bf", keyed(RECORDS))
+    json_cache.save_to_cache("site_file_rows", {"file_name": "CMDBData-x.csv", "computers": {"1": "a"}})
+    json_cache.flush()
+
+    cache = SQLiteCacheManager(db_path, legacy_filename=json_path)
+    try:
+        assert cache.get_records("sx_to_bf") == json_cache.get_records("sx_to_bf")
+        assert cache.load_from_cache("site_file_rows") == {"file_name": "CMDBData-x.csv", "computers": {"1": "a"}}
+        assert cache.detect_changes("sx_to_bf", keyed(RECORDS)).changed == []
+    finally:
+        cache.close()
+    assert not os.path.exists(json_path)
+    assert os.path.exists(json_path + ".migrated")
+
+
+def test_failed_run_keeps_the_legacy_cache(cache):
+    cache.save_to_cache("sx_to_bf", RECORDS[:2])
+
+    def failing_pages():
+        yield from keyed(RECORDS[:1])
+        raise RuntimeError("page 2 failed")
+
+    with pytest.raises(RuntimeError):
+        cache.detect_changes("sx_to_bf", failing_pages())
+    cache.flush()
+
+    reloaded = type(cache)(cache.filename)
+    assert reloaded.load_from_cache("sx_to_bf") == RECORDS[:2]
+    assert reloaded.detect_changes("sx_to_bf", keyed(RECORDS)).changed == [RECORDS[2]]
+
+
+def test_flush_does_not_overwrite_an_unreadable_cache_file(tmp_path):
+    path = str(tmp_path / "RecordsCache.json.gz")
+    cache = CacheManager(path)
+    cache.detect_changes("sx_to_bf", keyed(RECORDS))
+    cache.save_to_cache("site_file_rows", {"file_name": "CMDBData-x.csv", "computers": {"1": "a"}})
+    cache.flush()
+    with open(path, "rb") as file:
+        content = file.read()
+
+    cache.save_to_cache("last_run", "2025-04-01")
+    # Truncated by another writer or a full disk
+    with open(path, "wb") as file:
+        file.write(content[:len(content) // 2])
+    cache.flush()
+
+    with open(path, "rb") as file:
+        assert file.read() == content[:len(content) // 2]
+    assert cache.dirty_keys == {"last_run"}
+
+    # Once the file is readable again the pending change is merged into it
+    with open(path, "wb") as file:
+        file.write(content)
+    cache.flush()
+    reloaded = CacheManager(path)
+    assert reloaded.load_from_cache("last_run") == "2025-04-01"
+    assert set(reloaded.get_records("sx_to_bf")) == {"1", "2", "3"}
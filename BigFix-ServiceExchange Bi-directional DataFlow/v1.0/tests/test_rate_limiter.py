@@ -0,0 +1,19 @@
+from utils.rate_limiter import RateLimiter
+
+
+def test_host_limiter_takes_the_latest_rate():
+    limiter = RateLimiter.for_host("https://ratelimit.example:52311", 10)
+    assert limiter.interval == 0.1
+
+    assert RateLimiter.for_host("https://ratelimit.example:52311/api/computers", 4) is limiter
+    assert limiter.interval == 0.25
+
+    RateLimiter.for_host("https://ratelimit.example:52311", 0)
+    assert limiter.interval == 0.0
+
+
+def test_hosts_have_separate_limiters():
+    first = RateLimiter.for_host("https://first.example", 5)
+    second = RateLimiter.for_host("https://second.example", 0)
+    assert first is not second
+    assert first.interval == 0.2
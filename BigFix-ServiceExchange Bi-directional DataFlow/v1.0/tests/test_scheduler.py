@@ -0,0 +1,80 @@
+import threading
+from datetime import datetime, timedelta
+import pytest
+from utils.scheduler import DataFlowScheduler, dataflow_lock, parse_iso8601_duration
+
+# Schedules start at the current time, so the simulated clock starts later
+START = datetime.now() + timedelta(days=1)
+INTERVAL = timedelta(minutes=10)
+
+
+class BlockingTask:
+    """Dataflow task that blocks until released and counts its runs."""
+    def __init__(self):
+        self.runs = []
+        self.started = threading.Semaphore(0)
+        self.release = threading.Event()
+
+    def __call__(self, name):
+        self.runs.append(name)
+        self.started.release()
+        assert self.release.wait(5)
+
+
+def run_overlapping(policy, tmp_path):
+    """Start a run, let the next one fall due while it is still going, then let every run finish."""
+    task = BlockingTask()
+    scheduler = DataFlowScheduler({"flow": "PT10M"}, task, overlap_policy=policy, lock_dir=str(tmp_path))
+    scheduler.tick(START)
+    assert task.started.acquire(timeout=5)
+
+    scheduler.tick(START + INTERVAL)
+    task.release.set()
+    # Coalesced runs are dropped once the scheduler stops, so wait for the worker to finish first
+    with scheduler.lock:
+        threads = list(scheduler.running.values())
+    for thread in threads:
+        thread.join(5)
+    scheduler.stop()
+    return task.runs
+
+
+def test_skip_drops_a_run_that_is_due_while_running(tmp_path):
+    assert run_overlapping("skip", tmp_path) == ["flow"]
+
+
+def test_coalesce_runs_once_more_after_the_current_run(tmp_path):
+    assert run_overlapping("coalesce", tmp_path) == ["flow", "flow"]
+
+
+def test_run_is_skipped_while_another_process_holds_the_lock(tmp_path):
+    runs = []
+    scheduler = DataFlowScheduler({"flow": "PT10M"}, runs.append, lock_dir=str(tmp_path))
+    lock = dataflow_lock(str(tmp_path), "flow")
+    assert lock.acquire(blocking=False)
+    try:
+        scheduler.execute("flow")
+    finally:
+        lock.release()
+    scheduler.execute("flow")
+
+    assert runs == ["flow"]
+
+
+def test_next_run_is_one_interval_after_the_due_time_was_noticed(tmp_path):
+    runs = []
+    scheduler = DataFlowScheduler({"flow": "PT10M"}, runs.append, run_on_start=False)
+    scheduler.tick(START + INTERVAL + timedelta(minutes=25))
+    scheduler.stop()
+
+    assert runs == ["flow"]
+    assert scheduler.next_run_times["flow"] == START + 2 * INTERVAL + timedelta(minutes=25)
+
+
+@pytest.mark.parametrize("duration, expected", [
+    ("PT30M", timedelta(minutes=30)),
+    ("P1DT2H", timedelta(days=1, hours=2)),
+    ("now", None),
+])
+def test_parse_iso8601_duration(duration, expected):
+    assert parse_iso8601_duration(duration) == expected
@@ -0,0 +1,79 @@
+import threading
+import pytest
+import utils.shared_snapshot as shared_snapshot
+from utils.shared_snapshot import SharedSnapshot
+
+
+class CountingLoader:
+    """Loader that blocks until released and counts its calls."""
+    def __init__(self, values=None):
+        self.calls = 0
+        self.values = list(values or [])
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        self.entered.set()
+        assert self.release.wait(5)
+        return self.values.pop(0) if self.values else ["snapshot", self.calls]
+
+
+def test_concurrent_callers_share_one_load():
+    loader = CountingLoader()
+    snapshot = SharedSnapshot(loader, ttl=60)
+    results = []
+
+    def consumer():
+        results.append(snapshot.get())
+
+    leader = threading.Thread(target=consumer)
+    leader.start()
+    assert loader.entered.wait(5)
+    followers = [threading.Thread(target=consumer) for _ in range(7)]
+    for thread in followers:
+        thread.start()
+    loader.release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert loader.calls == 1
+    assert results == [["snapshot", 1]] * 8
+
+
+def test_snapshot_is_reloaded_after_the_ttl(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(shared_snapshot.time, "monotonic", lambda: clock[0])
+    loader = CountingLoader()
+    loader.release.set()
+    snapshot = SharedSnapshot(loader, ttl=120)
+
+    assert snapshot.get() == ["snapshot", 1]
+    clock[0] += 119
+    assert snapshot.get() == ["snapshot", 1]
+    clock[0] += 2
+    assert snapshot.get() == ["snapshot", 2]
+    snapshot.invalidate()
+    assert snapshot.get() == ["snapshot", 3]
+
+
+def test_failed_loads_are_not_reused():
+    loader = CountingLoader(values=[None, ["recovered"]])
+    loader.release.set()
+    snapshot = SharedSnapshot(loader, ttl=60)
+
+    assert snapshot.get() is None
+    assert snapshot.get() == ["recovered"]
+    assert loader.calls == 2
+
+
+def test_loader_error_releases_waiting_callers():
+    def failing_loader():
+        raise RuntimeError("BigFix is unavailable")
+
+    snapshot = SharedSnapshot(failing_loader, ttl=60)
+    with pytest.raises(RuntimeError):
+        snapshot.get()
+    # The failed flight is cleared, so the next caller loads again instead of waiting forever
+    snapshot.loader = lambda: ["fresh"]
+    assert snapshot.get() == ["fresh"]
@@ -0,0 +1,95 @@
+import threading
+import pytest
+from sx_data_operations.api_handler import SXAPIHandler
+from utils import codec
+
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+        self.text = content.decode("utf-8")
+
+
+class FakeBulkEndpoint:
+    """Records posted pages and answers with canned responses, or raises for failed attempts."""
+    def __init__(self, responses=None):
+        self.responses = list(responses or [])
+        self.pages = []
+        self.lock = threading.Lock()
+
+    def request(self, method, endpoint, data, **kwargs):
+        with self.lock:
+            self.pages.append(codec.loads(data))
+            response = self.responses.pop(0) if self.responses else b'{"status": "success"}'
+        if isinstance(response, Exception):
+            raise response
+        return FakeResponse(response)
+
+
+def make_handler(endpoint, record_limit=3, upload_workers=1, page_retries=0):
+    handler = SXAPIHandler(
+        config_path=None, record_limit=record_limit, base_url="https://sx.example", username="user", password="password",
+        proxy_url=None, proxy_username=None, proxy_password=None, verify=False, x_user_payload=None,
+        sx_properties_sx_to_bf={}, delta=None, page_retries=page_retries, retry_backoff=0, upload_workers=upload_workers
+    )
+    handler.APIRequestHandler = endpoint
+    return handler
+
+
+@pytest.mark.parametrize("response, expected", [
+    (b'{"status": "success"}', []),
+    (b'{"status": "Failure", "message": "invalid payload"}', [0, 1, 2]),
+    (b'{"result": [{"status": "success"}, {"status": "error", "message": "CI class missing"}, {"status": "success"}]}', [1]),
+    (b'{"errors": [{"index": 2, "message": "duplicate CI"}]}', [2]),
+    (b'{"errors": [{"message": "duplicate CI"}]}', [0, 1, 2]),
+    (b'OK', []),
+], ids=["accepted", "page failed", "record result", "indexed error", "unindexed error", "not json"])
+def test_failed_record_offsets(response, expected):
+    assert SXAPIHandler.failed_record_offsets(response, 3) == expected
+
+
+def test_rejected_records_are_reported_by_position():
+    endpoint = FakeBulkEndpoint([
+        b'{"status": "success"}',
+        b'{"result": [{"status": "success"}, {"status": "error"}, {"status": "success"}]}',
+    ])
+    handler = make_handler(endpoint)
+
+    assert handler.post_computer_details([{"ciName": f"host{i}"} for i in range(5)]) == [4]
+
+
+def test_pages_follow_the_record_limit_plan():
+    endpoint = FakeBulkEndpoint()
+    handler = make_handler(endpoint, record_limit=3, upload_workers=4)
+    records = [{"ciName": f"host{i}"} for i in range(10)]
+
+    assert handler.post_computer_details(records) == []
+
+    pages = sorted(endpoint.pages, key=lambda page: page["meta"]["currentPage"])
+    assert [page["meta"]["currentPage"] for page in pages] == [1, 2, 3, 4]
+    assert [page["meta"]["currentCount"] for page in pages] == [3, 3, 3, 1]
+    assert {page["meta"]["totalCount"] for page in pages} == {10}
+    assert [record for page in pages for record in page["data"]] == records
+    # The last page reaches the server after every other page
+    assert endpoint.pages[-1]["meta"]["currentPage"] == 4
+
+
+def test_failed_page_is_retried():
+    endpoint = FakeBulkEndpoint([RuntimeError("An error occurred during the request: 502 Bad Gateway"), b'{"status": "success"}'])
+    handler = make_handler(endpoint, page_retries=1)
+
+    assert handler.post_computer_details([{"ciName": "host1"}, {"ciName": "host2"}]) == []
+    assert len(endpoint.pages) == 2
+
+
+def test_page_failing_every_attempt_reports_its_records():
+    endpoint = FakeBulkEndpoint([
+        b'{"status": "success"}',
+        RuntimeError("An error occurred during the request: 503 Service Unavailable"),
+        RuntimeError("An error occurred during the request: 503 Service Unavailable"),
+    ])
+    handler = make_handler(endpoint, record_limit=2, page_retries=1)
+
+    assert handler.post_computer_details([{"ciName": f"host{i}"} for i in range(4)]) == [2, 3]
@@ -0,0 +1,37 @@
+import threading
+
+class AdaptiveBatchSizer:
+    """
+    Tunes the size of upload batches so that each request completes close to a target response time.
+    Slow responses halve the batch size; fast responses grow it again up to max_size.
+    """
+    def __init__(self, max_size, min_size=1, target_seconds=0):
+        """
+        :param max_size: Largest (and initial) batch size.
+        :param min_size: Smallest batch size (default is 1).
+        :param target_seconds: Target response time per batch (0 disables tuning).
+        """
+        self.max_size = max(1, int(max_size))
+        self.min_size = max(1, min(int(min_size), self.max_size))
+        self.target_seconds = float(target_seconds)
+        self.size = self.max_size
+        self.lock = threading.Lock()
+
+    def next_size(self):
+        """
+        Return the size to use for the next batch.
+        """
+        with self.lock:
+            return self.size
+
+    def record(self, batch_size, elapsed_seconds):
+        """
+        Adjust the batch size using the response time of a completed batch.
+        """
+        if not self.target_seconds:
+            return
+        with self.lock:
+            if elapsed_seconds > self.target_seconds * 1.5:
+                self.size = max(self.min_size, self.size // 2)
+            elif elapsed_seconds < self.target_seconds / 2 and batch_size >= self.size:
+                self.size = min(self.max_size, self.size + max(1, self.size // 2))
@@ -1,8 +1,15 @@
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from urllib.parse import urlparse
 
 class APIRequest:
-    def __init__(self, base_url=None, proxy_url=None, proxy_username=None, proxy_password=None):
+    # Pooled sessions shared by every APIRequest talking to the same datasource
+    _sessions = {}
+    _sessions_lock = threading.Lock()
+
+    def __init__(self, base_url=None, proxy_url=None, proxy_username=None, proxy_password=None, pool_size=10):
         """
         Initialize the APIRequest class with optional base URL and proxy configuration.
 
@@ -10,10 +17,11 @@ class APIRequest:
         :param proxy_url: Proxy URL (default is None).
         :param proxy_username: Username for the proxy (default is None).
         :param proxy_password: Password for the proxy (default is None).
+        :param pool_size: Number of keep-alive connections kept open to the datasource (default is 10).
         """
         self.base_url = base_url
         self.proxies = None
-        
+
         if proxy_url:
             self.proxies = {
                 "http": proxy_url,
@@ -24,7 +32,42 @@ class APIRequest:
                 self.proxies["http"] = f"http://{proxy_username}:{proxy_password}@{proxy_url}"
                 self.proxies["https"] = f"https://{proxy_username}:{proxy_password}@{proxy_url}"
 
-    def request(self, method, endpoint=None, username=None, password=None, headers=None, params=None, data=None, json=None, verify=True):
+        self.session = self.get_session(base_url, self.proxies, pool_size)
+
+    @classmethod
+    def get_session(cls, base_url, proxies, pool_size):
+        """
+        Return the pooled session shared by all requests to the datasource at base_url.
+        Connections, TLS sessions and proxy authentication are reused across requests.
+        """
+        parsed_url = urlparse(base_url or "")
+        key = (parsed_url.scheme, parsed_url.netloc, tuple(sorted((proxies or {}).items())))
+
+        with cls._sessions_lock:
+            session = cls._sessions.get(key)
+            if session is None:
+                session = requests.Session()
+                session.pool_size = 0
+                cls._sessions[key] = session
+
+            if pool_size > session.pool_size:
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.pool_size = pool_size
+            return session
+
+    @classmethod
+    def close_sessions(cls):
+        """
+        Close all pooled sessions and their open connections.
+        """
+        with cls._sessions_lock:
+            for session in cls._sessions.values():
+                session.close()
+            cls._sessions.clear()
+
+    def request(self, method, endpoint=None, username=None, password=None, headers=None, params=None, data=None, json=None, files=None, verify=True, stream=False):
         """
         Make an API request using the specified method.
 
@@ -36,6 +79,8 @@ class APIRequest:
         :param params: Query parameters for GET requests (default is None).
         :param data: Form data for POST/PUT requests (default is None).
         :param json: JSON payload for POST/PUT requests (default is None).
+        :param files: Files for multipart POST requests (default is None).
+        :param stream: Return before the body is downloaded so it can be read incrementally from response.raw (default is False).
         :return: Response object.
         """
         if endpoint:
@@ -47,18 +92,28 @@ class APIRequest:
         auth = HTTPBasicAuth(username, password) if username and password else None
 
         try:
-            response = requests.request(
+            response = self.session.request(
                 method=method,
                 url=url,
                 headers=headers,
                 params=params,
                 data=data,
                 json=json,
+                files=files,
                 auth=auth,
+                # Passed per request so the configured proxy takes precedence over HTTP(S)_PROXY environment variables
                 proxies=self.proxies,
-                verify=verify
+                verify=verify,
+                stream=stream
             )
-            response.raise_for_status()  # Raise an exception for HTTP errors
+            try:
+                response.raise_for_status()  # Raise an exception for HTTP errors
+            except requests.exceptions.HTTPError:
+                if stream:
+                    # The body was never read; release the pooled connection now instead of at garbage collection
+                    response.close()
+                raise
             return response
         except requests.exceptions.RequestException as e:
-            raise RuntimeError(f"An error occurred during the request: {e}")
\ No newline at end of file
+            # Keep the original exception as the cause so callers can inspect the response status
+            raise RuntimeError(f"An error occurred during the request: {e}") from e
\ No newline at end of file
@@ -0,0 +1,87 @@
+import json
+import functools
+import xml.etree.ElementTree as ET
+
+# Faster codecs are used when they are installed; the standard library is the fallback
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+# orjson.JSONDecodeError is a subclass, so this catches decoding errors of both backends
+JSONDecodeError = json.JSONDecodeError
+
+# Returned by loads_nested for strings that are not JSON
+NOT_JSON = object()
+
+# Characters a JSON document can start with
+JSON_START = frozenset('{["-0123456789tfn')
+
+# Non-string keys are written as strings, as the standard library does
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+
+def loads(data):
+    """
+    Decode a JSON document from str or UTF-8 bytes.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj, default=None):
+    """
+    Encode obj as compact JSON text. Non-ASCII characters are written as is.
+
+    :param default: Function converting objects that are not JSON serializable (default is None).
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=ORJSON_OPTIONS).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=default)
+
+
+def dumps_bytes(obj, default=None):
+    """
+    Encode obj as compact UTF-8 encoded JSON.
+
+    :param default: Function converting objects that are not JSON serializable (default is None).
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=ORJSON_OPTIONS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=default).encode("utf-8")
+
+
+@functools.lru_cache(maxsize=1024)
+def _loads_nested(value):
+    try:
+        return loads(value)
+    except JSONDecodeError:
+        return NOT_JSON
+
+
+def loads_nested(value):
+    """
+    Decode a JSON document embedded in a string value, or return NOT_JSON if it is not JSON.
+
+    Plain strings are recognised by their first character without attempting to decode them.
+    Decoded values are cached by content, so a nested document read for several properties
+    of a record is decoded once; callers must not modify the returned value.
+    """
+    if value.lstrip()[:1] not in JSON_START:
+        return NOT_JSON
+    return _loads_nested(value)
+
+
+def iterparse(source, events=("end",)):
+    """
+    Incrementally parse XML from a binary file-like object, yielding (event, element) pairs.
+    """
+    if lxml_etree is not None:
+        return lxml_etree.iterparse(source, events=events)
+    return ET.iterparse(source, events=events)
@@ -0,0 +1,170 @@
+import os
+import threading
+import xml.etree.ElementTree as ET
+from types import MappingProxyType
+
+SX_TO_BF = "Transfer Asset Data from ServiceExchange to Bigfix"
+BF_TO_SX = "Transfer Asset Data from Bigfix to ServiceExchange"
+
+
+class DataFlowConfig:
+    """
+    Parsed DataFlowsConfig.xml with the mappings the dataflows need precomputed.
+    Instances are read-only snapshots of the file: writing the configuration returns a new instance,
+    so per-record work only does dictionary lookups and never touches the XML again.
+    """
+    _loaded = {}
+    _loaded_lock = threading.Lock()
+
+    def __init__(self, path):
+        """
+        :param path: Path of DataFlowsConfig.xml.
+        """
+        self.path = path
+        self.base_dir = os.path.dirname(path)
+        root = ET.parse(path).getroot()
+
+        self.unique_hash = root.get("uniquehash", "").strip()
+        self.settings = MappingProxyType({setting.get('key'): setting.get('value') for setting in root.findall(".//settings/setting")})
+        self.datasources = MappingProxyType({
+            datasource.get("datasourcename"): MappingProxyType(dict(datasource.attrib))
+            for datasource in root.findall(".//datasources/datasource")
+        })
+        self.schedules = MappingProxyType({dataflow.get("displayname"): dataflow.get("schedule") for dataflow in root.findall(".//dataflows/dataflow")})
+
+        # {dataflow name: {datasource name: {display name: {"propertyname", "type"}}}}, None for missing dataflows
+        self.dataflows_properties = MappingProxyType({
+            dataflow_name: self._parse_dataflow_properties(root.find(f".//dataflows/dataflow[@displayname='{dataflow_name}']"))
+            for dataflow_name in (SX_TO_BF, BF_TO_SX)
+        })
+
+        self._parse_sx_to_bf(root.find(f".//dataflow[@displayname='{SX_TO_BF}']"))
+        self._parse_bf_to_sx(root.find(f".//dataflow[@displayname='{BF_TO_SX}']"))
+        self._parse_identities(root)
+
+    @classmethod
+    def load(cls, path, reload=False):
+        """
+        Return the parsed configuration at path, shared by every caller until the file changes.
+
+        :param path: Path of DataFlowsConfig.xml.
+        :param reload: Parse the file again even if it looks unchanged.
+        """
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with cls._loaded_lock:
+            loaded = cls._loaded.get(path)
+            if reload or loaded is None or loaded[0] != version:
+                loaded = (version, cls(path))
+                cls._loaded[path] = loaded
+            return loaded[1]
+
+    @staticmethod
+    def _parse_dataflow_properties(dataflow):
+        if dataflow is None:
+            return None
+        properties_dict = {}
+        for adapter in ["sourceadapter", "targetadapter"]:
+            adapter_element = dataflow.find(adapter)
+            if adapter_element is not None:
+                device_properties = adapter_element.find("device_properties")
+                if device_properties is not None:
+                    adapter_properties = {}
+                    # Include <property> and <identityproperty> nodes
+                    for prop_node in device_properties.findall("./property") + device_properties.findall("./identityproperty"):
+                        adapter_properties[prop_node.get("displayname")] = MappingProxyType({
+                            "propertyname": prop_node.get("propertyname"),
+                            "type": prop_node.get("type", "general")  # Default to 'general' if 'type' is missing
+                        })
+                    properties_dict[adapter_element.get("datasourcename")] = MappingProxyType(adapter_properties)
+        return MappingProxyType(properties_dict)
+
+    @staticmethod
+    def _backend_to_display(adapter):
+        device_properties = adapter.find("device_properties") if adapter is not None else None
+        if device_properties is None:
+            return {}
+        return {prop.attrib["propertyname"]: prop.attrib["displayname"] for prop in device_properties}
+
+    def _parse_sx_to_bf(self, dataflow):
+        """
+        Backend to display name mappings of both adapters, the analysis property list and the BigFix ID property.
+        """
+        source_adapter = dataflow.find("sourceadapter") if dataflow is not None else None
+        target_adapter = dataflow.find("targetadapter") if dataflow is not None else None
+        self.sx_mappings = MappingProxyType(self._backend_to_display(source_adapter))
+        self.bf_mappings = MappingProxyType(self._backend_to_display(target_adapter))
+        self.sx_id_display_name = self.sx_mappings.get("CI_ID")
+        self.bigfix_id_display_name = self.bf_mappings.get("ID")
+
+        # Analysis properties: every SX property followed by the non-identity BigFix properties
+        property_names = []
+        if source_adapter is not None and source_adapter.find("device_properties") is not None:
+            property_names += [p.attrib["displayname"] for p in source_adapter.find("device_properties")]
+        if target_adapter is not None and target_adapter.find("device_properties") is not None:
+            property_names += [p.attrib["displayname"] for p in target_adapter.find("device_properties").findall("property")]
+        self.property_names = tuple(property_names)
+
+    def _parse_bf_to_sx(self, dataflow):
+        """
+        BigFix to SX property mappings, split into direct properties and client settings, and the custom SX tags.
+        The mappings are None when the dataflow does not define properties on both adapters.
+        """
+        self.bf_to_sx_direct_mapping = None
+        self.bf_to_sx_setting_mapping = None
+        self.bf_to_sx_custom_tags = ()
+        source_device_props = dataflow.find("sourceadapter/device_properties") if dataflow is not None else None
+        target_device_props = dataflow.find("targetadapter/device_properties") if dataflow is not None else None
+        if source_device_props is None or target_device_props is None:
+            return
+
+        direct_mapping = {}  # For <property> and <identityproperty>
+        setting_mapping = {}  # For <setting>
+        # Source and target properties are paired by position
+        for src_prop, tgt_prop in zip(source_device_props, target_device_props):
+            src_name = src_prop.get("propertyname")
+            tgt_name = tgt_prop.get("propertyname")
+            if not src_name or not tgt_name:
+                continue
+            if src_prop.tag.lower() == "setting":
+                setting_mapping[src_name] = tgt_name
+            else:
+                direct_mapping[src_name] = tgt_name
+
+        self.bf_to_sx_direct_mapping = MappingProxyType(direct_mapping)
+        self.bf_to_sx_setting_mapping = MappingProxyType(setting_mapping)
+        self.bf_to_sx_custom_tags = tuple(prop.get("propertyname") for prop in target_device_props if prop.get("type", "general") == "custom")
+
+    def _parse_identities(self, root):
+        """
+        Identity properties used for correlation, {"bigfix"|"sx": {display name: property name}},
+        and their optional weights, {"bigfix"|"sx": {display name: weight or None}}.
+        """
+        identity_properties = {"bigfix": {}, "sx": {}}
+        identity_weights = {"bigfix": {}, "sx": {}}
+        for side, adapter_path in (("sx", ".//sourceadapter"), ("bigfix", ".//targetadapter")):
+            adapter = root.find(adapter_path)
+            if adapter is not None:
+                for prop in adapter.findall(".//identityproperty"):
+                    weight = prop.attrib.get("weight")
+                    identity_properties[side][prop.attrib["displayname"]] = prop.attrib["propertyname"]
+                    identity_weights[side][prop.attrib["displayname"]] = int(weight) if weight else None
+        self.identity_properties = MappingProxyType({side: MappingProxyType(values) for side, values in identity_properties.items()})
+        self.identity_weights = MappingProxyType({side: MappingProxyType(values) for side, values in identity_weights.items()})
+
+    def datasource(self, name):
+        """
+        Attributes of the datasource called name, or None if it is not configured.
+        """
+        return self.datasources.get(name)
+
+    def write(self, update):
+        """
+        Apply update(root) to the configuration file and return the newly parsed configuration.
+        The file is parsed again first so changes made since this instance was loaded are kept,
+        together with the comments documenting the settings.
+        """
+        tree = ET.parse(self.path, parser=ET.XMLParser(target=ET.TreeBuilder(insert_comments=True)))
+        update(tree.getroot())
+        tree.write(self.path, encoding="utf-8", xml_declaration=True)
+        return DataFlowConfig.load(self.path, reload=True)
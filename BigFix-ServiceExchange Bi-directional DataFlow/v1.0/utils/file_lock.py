@@ -0,0 +1,72 @@
+import time
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+    import fcntl
+
+
+class FileLock:
+    """
+    Exclusive lock on a lock file, shared by threads and processes working on the same file.
+    """
+    def __init__(self, path, timeout=None, poll_interval=0.1):
+        """
+        :param path: Path of the lock file. It is created if it does not exist.
+        :param timeout: Seconds to wait for the lock (None waits forever).
+        :param poll_interval: Seconds between attempts while the lock is held elsewhere.
+        """
+        self.path = path
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.handle = None
+
+    def _try_lock(self, handle):
+        try:
+            if msvcrt:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self, blocking=True):
+        """
+        Acquire the lock. Returns False if it could not be acquired without blocking or within the timeout.
+        """
+        handle = open(self.path, "a+")
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while not self._try_lock(handle):
+            if not blocking or (deadline is not None and time.monotonic() >= deadline):
+                handle.close()
+                return False
+            time.sleep(self.poll_interval)
+        self.handle = handle
+        return True
+
+    def release(self):
+        """
+        Release the lock if it is held.
+        """
+        if self.handle is None:
+            return
+        try:
+            if msvcrt:
+                self.handle.seek(0)
+                msvcrt.locking(self.handle.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self.handle.fileno(), fcntl.LOCK_UN)
+        finally:
+            self.handle.close()
+            self.handle = None
+
+    def __enter__(self):
+        if not self.acquire():
+            raise TimeoutError(f"Timed out waiting for lock file {self.path}")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
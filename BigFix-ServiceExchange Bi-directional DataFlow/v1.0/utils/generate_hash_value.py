@@ -1,5 +1,4 @@
 import hashlib
-import xml.etree.ElementTree as ET
 import time
 
 class CryptoServices:
@@ -11,18 +10,18 @@ class CryptoServices:
         return CryptoServices.__instance
 
     @staticmethod
-    def generate_unique_hash(config_path):
-        tree = ET.parse(config_path)
-        root = tree.getroot()
-        
+    def generate_unique_hash(config):
+        """
+        Generate a new CMDB hash and store it in the configuration.
+
+        :param config: Parsed DataFlowConfig to update.
+        :return: The new hash. DataFlowConfig.load returns the updated configuration from now on.
+        """
         # Generate a new hash based on the timestamp
         unique_hash = hashlib.sha384(str(int(time.time())).encode('utf-8')).hexdigest()
         
-        # Update the unique_hash attribute
-        root.set("uniquehash", unique_hash)
-        
-        # Save changes back to the XML file
-        tree.write(config_path, encoding="utf-8", xml_declaration=True)
+        # Update the unique_hash attribute and save changes back to the XML file
+        config.write(lambda root: root.set("uniquehash", unique_hash))
         
         print(f"New Unique Hash Generated: {unique_hash}")
-        return unique_hash
\ No newline at end of file
+        return unique_hash
@@ -1,42 +1,116 @@
 import os
 import json
 import gzip
+import hashlib
+import sqlite3
+import threading
+from collections import namedtuple
 from logger import logger
+from utils.file_lock import FileLock
+from utils import codec
+
+# Result of CacheManager.detect_changes; `changed` holds inserted and updated records in input order
+# and `changed_ids` their identities
+ChangeSet = namedtuple("ChangeSet", ["inserted", "updated", "deleted", "changed", "changed_ids"])
 
 class CacheManager:
+    """
+    Cache persisted as a gzip compressed JSON file. Changes are kept in memory and written by flush(),
+    which merges them into the file under a file lock and replaces the file atomically.
+    """
     def __init__(self, filename):
         self.filename = filename
-        self.cache_data = self._load_cache_file()
+        self.lock = threading.RLock()
+        self.file_lock = FileLock(filename + ".lock")
+        self.dirty_keys = set()
+        self.dirty_records = {}
+        self.cleared = False
+        with self.file_lock:
+            self.cache_data = self._load_cache_file()
+        if self.cache_data is None:
+            self.cache_data = {}
 
     def _load_cache_file(self):
+        """
+        Read the cache file. Returns {} if there is no cache file yet and None if it cannot be read or decoded.
+        """
         if os.path.exists(self.filename):
             try:
-                with gzip.open(self.filename, "rt", encoding="utf-8") as file:
+                with gzip.open(self.filename, "rb") as file:
                     logger.info(f"Loading cache from file: {self.filename}")
-                    data = json.load(file)
+                    data = codec.loads(file.read())
                     if isinstance(data, dict):
                         logger.info("Cache file loaded successfully.")
                         return data
                     else:
                         logger.error(f"Unexpected data type in cache file: {type(data)}. Expected a dictionary.")
-                        return {}
+                        return None
             except Exception as e:
                 logger.error(f"Error loading cache file: {e}")
+                return None
         else:
             logger.info(f"No cache file found at {self.filename}. Starting fresh.")
         return {}
 
-    def _save_cache_file(self):
+    def _save_cache_file(self, cache_data):
+        """
+        Write the cache to a temporary file and move it over the cache file, so a crash
+        never leaves a partially written cache behind.
+        """
+        temp_filename = f"{self.filename}.{os.getpid()}.tmp"
         try:
-            with gzip.open(self.filename, "wt", encoding="utf-8") as file:
-                json.dump(self.cache_data, file, ensure_ascii=False, indent=None, separators=(",", ":"))
-                logger.info("Cache file saved successfully.")
+            with open(temp_filename, "wb") as raw_file:
+                with gzip.open(raw_file, "wb") as file:
+                    file.write(codec.dumps_bytes(cache_data))
+                raw_file.flush()
+                os.fsync(raw_file.fileno())
+            os.replace(temp_filename, self.filename)
+            logger.info("Cache file saved successfully.")
+            return True
         except Exception as e:
             logger.error(f"Error saving cache file: {e}")
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+            return False
+
+    def flush(self):
+        """
+        Persist pending changes. The file is re-read under the lock and only the keys and records
+        changed by this instance are merged into it, so concurrent dataflows do not overwrite each other.
+        """
+        with self.lock:
+            if not (self.dirty_keys or self.dirty_records or self.cleared):
+                return
+            with self.file_lock:
+                cache_data = {} if self.cleared else self._load_cache_file()
+                if cache_data is None:
+                    # Merging into an empty cache would drop every key and record this run did not change
+                    logger.error(f"Cache file {self.filename} could not be read; pending changes are not saved. Run with --reset to start a new cache.")
+                    return
+                for key in self.dirty_keys:
+                    if key in self.cache_data:
+                        cache_data[key] = self.cache_data[key]
+                    else:
+                        cache_data.pop(key, None)
+                for namespace, record_ids in self.dirty_records.items():
+                    records = self.cache_data.get("records", {}).get(namespace, {})
+                    merged = cache_data.setdefault("records", {}).setdefault(namespace, {})
+                    for record_id in record_ids:
+                        if record_id in records:
+                            merged[record_id] = records[record_id]
+                        else:
+                            merged.pop(record_id, None)
+                if not self._save_cache_file(cache_data):
+                    return
+            self.cache_data = cache_data
+            self.dirty_keys.clear()
+            self.dirty_records.clear()
+            self.cleared = False
 
     def save_to_cache(self, key, data):
-        self.cache_data[key] = data
-        self._save_cache_file()
+        with self.lock:
+            self.cache_data[key] = data
+            self.dirty_keys.add(key)
         logger.info(f"Data cached successfully under key '{key}'.")
 
     def load_from_cache(self, key):
@@ -48,14 +122,263 @@ class CacheManager:
             return None
 
     def clear_cache(self, key=None):
-        if key:
-            if key in self.cache_data:
-                del self.cache_data[key]
-                self._save_cache_file()
+        with self.lock:
+            if key:
+                if key in self.cache_data:
+                    del self.cache_data[key]
+                    self.dirty_keys.add(key)
+                    logger.info(f"Cache for key '{key}' cleared successfully.")
+                else:
+                    logger.warning(f"Key '{key}' not found in cache.")
+            else:
+                self.cache_data.clear()
+                self.dirty_keys.clear()
+                self.dirty_records.clear()
+                self.cleared = True
+                logger.info("All cache cleared successfully.")
+
+    def pop_from_cache(self, key):
+        """
+        Remove a key from the cache and return its value, or None if the key does not exist.
+        """
+        with self.lock:
+            if key not in self.cache_data:
+                return None
+            self.dirty_keys.add(key)
+            return self.cache_data.pop(key)
+
+    def get_records(self, namespace):
+        """
+        Return all records stored in a namespace as a dictionary {record ID: value}.
+        """
+        with self.lock:
+            return dict(self.cache_data.get("records", {}).get(namespace, {}))
+
+    def get_record(self, namespace, record_id):
+        """
+        Return a single record of a namespace, or None if it does not exist.
+        """
+        return self.cache_data.get("records", {}).get(namespace, {}).get(record_id)
+
+    def upsert_records(self, namespace, records):
+        """
+        Insert or replace records given as a dictionary {record ID: value}.
+        """
+        if not records:
+            return
+        with self.lock:
+            self.cache_data.setdefault("records", {}).setdefault(namespace, {}).update(records)
+            self.dirty_records.setdefault(namespace, set()).update(records)
+
+    def delete_records(self, namespace, record_ids):
+        """
+        Delete records of a namespace. Unknown record IDs are ignored.
+        """
+        if not record_ids:
+            return
+        with self.lock:
+            stored = self.cache_data.get("records", {}).get(namespace, {})
+            for record_id in record_ids:
+                stored.pop(record_id, None)
+            self.dirty_records.setdefault(namespace, set()).update(record_ids)
+
+    def close(self):
+        """
+        Flush pending changes at the end of a run.
+        """
+        self.flush()
+
+    @staticmethod
+    def record_hash(record):
+        """
+        Return a stable content hash of a JSON-serializable record.
+        """
+        # Always the standard library encoder: stored hashes must not change with the installed codec
+        serialized = json.dumps(record, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+        return hashlib.sha1(serialized.encode("utf-8")).hexdigest()
+
+    def detect_changes(self, key, keyed_records, normalize=None, complete=True):
+        """
+        Compare records against the content-hash index stored under key and update the index.
+
+        :param key: Record namespace holding the index ({record identity: content hash}).
+        :param keyed_records: Iterable of (identity, record) pairs; records without an identity are keyed by their content hash.
+        :param normalize: Optional function applied to a record before hashing.
+        :param complete: False when the records are a partial (delta) view; absent records are then kept and not reported as deleted.
+        :return: ChangeSet of inserted records, updated records, deleted identities and all changed records.
+        """
+        stored = self.get_records(key)
+        upserts = {}
+        legacy_hashes = None
+        # The legacy value is removed only once every record was seen and the index written,
+        # so a run failing partway through keeps it for the next run
+        legacy = self.load_from_cache(key)
+        if isinstance(legacy, dict) and "index" in legacy:
+            # Index written as a single cache key before records were stored individually
+            upserts.update(legacy["index"])
+            stored = dict(stored, **legacy["index"])
+        elif legacy is not None:
+            # Caches written before the hash index stored the full record list; unchanged records are recognised by content
+            legacy_records = legacy.get("sx_data", []) if isinstance(legacy, dict) else legacy
+            legacy_hashes = {self.record_hash(normalize(record) if normalize else record) for record in legacy_records}
+
+        seen = set()
+        inserted, updated, changed, changed_ids = [], [], [], []
+
+        for record_id, record in keyed_records:
+            digest = self.record_hash(normalize(record) if normalize else record)
+            record_id = str(record_id) if record_id not in (None, "") else digest
+            if record_id in seen:
+                # Duplicate identity in this batch: track the record by content instead
+                record_id = digest
+            seen.add(record_id)
+            if stored.get(record_id) != digest:
+                upserts[record_id] = digest
+
+            previous = stored.get(record_id)
+            if previous is None:
+                if legacy_hashes is not None and digest in legacy_hashes:
+                    continue
+                inserted.append(record)
+                changed.append(record)
+                changed_ids.append(record_id)
+            elif previous != digest:
+                updated.append(record)
+                changed.append(record)
+                changed_ids.append(record_id)
+
+        deleted = [record_id for record_id in stored if record_id not in seen] if complete else []
+
+        # Only changed entries are written; the rest of the index stays untouched
+        self.upsert_records(key, upserts)
+        self.delete_records(key, deleted)
+        if legacy is not None:
+            self.pop_from_cache(key)
+        logger.info(f"Change detection for '{key}': {len(inserted)} inserted, {len(updated)} updated, {len(deleted)} deleted.")
+        return ChangeSet(inserted, updated, deleted, changed, changed_ids)
+
+    def forget_records(self, key, record_ids):
+        """
+        Remove records from the hash index stored in the key namespace so they are reported as changed on the next run.
+        Used for records that could not be delivered.
+        """
+        self.delete_records(key, record_ids)
+        logger.info(f"{len(record_ids)} records will be resent from '{key}' on the next run.")
+
+
+class SQLiteCacheManager(CacheManager):
+    """
+    Cache backed by a SQLite database. Records are stored and updated individually,
+    so lookups and upserts do not load or rewrite the whole cache.
+    """
+    def __init__(self, filename, legacy_filename=None):
+        """
+        :param filename: Path of the SQLite database.
+        :param legacy_filename: Optional JSON.gz cache imported when the database is created.
+        """
+        self.filename = filename
+        self.lock = threading.Lock()
+        is_new = not os.path.exists(filename)
+        # Concurrent dataflows wait for each other's transactions instead of failing
+        self.connection = sqlite3.connect(filename, timeout=30, check_same_thread=False)
+        with self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS records (namespace TEXT NOT NULL, record_id TEXT NOT NULL, value TEXT NOT NULL, "
+                "PRIMARY KEY (namespace, record_id)) WITHOUT ROWID"
+            )
+        logger.info(f"Using SQLite cache: {self.filename}")
+        if is_new and legacy_filename and os.path.exists(legacy_filename):
+            self._import_cache_file(legacy_filename)
+
+    def _import_cache_file(self, legacy_filename):
+        """
+        Import a JSON.gz cache into the database and rename it so it is imported only once.
+        """
+        cache_data = CacheManager(legacy_filename).cache_data
+        records = cache_data.pop("records", {})
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)",
+                ((key, self._dumps(data)) for key, data in cache_data.items())
+            )
+            for namespace, namespace_records in records.items():
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO records (namespace, record_id, value) VALUES (?, ?, ?)",
+                    ((namespace, record_id, self._dumps(data)) for record_id, data in namespace_records.items())
+                )
+        os.replace(legacy_filename, legacy_filename + ".migrated")
+        logger.info(f"Migrated cache file {legacy_filename} to {self.filename}.")
+
+    @staticmethod
+    def _dumps(data):
+        return codec.dumps(data)
+
+    def save_to_cache(self, key, data):
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO cache (key, value) VALUES (?, ?)", (key, self._dumps(data)))
+        logger.info(f"Data cached successfully under key '{key}'.")
+
+    def load_from_cache(self, key):
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            logger.warning(f"Key '{key}' not found in cache.")
+            return None
+        logger.info(f"Data loaded successfully for key '{key}'.")
+        return codec.loads(row[0])
+
+    def pop_from_cache(self, key):
+        with self.lock, self.connection:
+            row = self.connection.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+        return codec.loads(row[0])
+
+    def clear_cache(self, key=None):
+        with self.lock, self.connection:
+            if key:
+                self.connection.execute("DELETE FROM cache WHERE key = ?", (key,))
                 logger.info(f"Cache for key '{key}' cleared successfully.")
             else:
-                logger.warning(f"Key '{key}' not found in cache.")
-        else:
-            self.cache_data.clear()
-            self._save_cache_file()
-            logger.info("All cache cleared successfully.")
\ No newline at end of file
+                self.connection.execute("DELETE FROM cache")
+                self.connection.execute("DELETE FROM records")
+                logger.info("All cache cleared successfully.")
+
+    def get_records(self, namespace):
+        with self.lock:
+            rows = self.connection.execute("SELECT record_id, value FROM records WHERE namespace = ?", (namespace,)).fetchall()
+        return {record_id: codec.loads(value) for record_id, value in rows}
+
+    def get_record(self, namespace, record_id):
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM records WHERE namespace = ? AND record_id = ?", (namespace, record_id)).fetchone()
+        return codec.loads(row[0]) if row else None
+
+    def upsert_records(self, namespace, records):
+        if not records:
+            return
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO records (namespace, record_id, value) VALUES (?, ?, ?)",
+                ((namespace, record_id, self._dumps(data)) for record_id, data in records.items())
+            )
+
+    def delete_records(self, namespace, record_ids):
+        if not record_ids:
+            return
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "DELETE FROM records WHERE namespace = ? AND record_id = ?",
+                ((namespace, record_id) for record_id in record_ids)
+            )
+
+    def flush(self):
+        # Every change is committed in its own transaction
+        pass
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
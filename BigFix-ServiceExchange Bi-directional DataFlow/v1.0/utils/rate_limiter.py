@@ -0,0 +1,60 @@
+import threading
+import time
+from urllib.parse import urlparse
+
+class RateLimiter:
+    """
+    Spaces out requests so that at most `rate` requests per second are started.
+    One limiter is shared by every caller talking to the same host.
+    """
+    _host_limiters = {}
+    _host_limiters_lock = threading.Lock()
+
+    def __init__(self, rate=0):
+        """
+        :param rate: Maximum number of requests per second (0 or None disables limiting).
+        """
+        self.interval = self.rate_interval(rate)
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def rate_interval(rate):
+        return 1.0 / float(rate) if rate else 0.0
+
+    @classmethod
+    def for_host(cls, url, rate=0):
+        """
+        Return the limiter shared by all requests to the host of the given URL.
+        The limiter takes the rate of the latest call, so a changed configuration applies to every caller.
+        """
+        host = urlparse(url).netloc if url else ""
+        with cls._host_limiters_lock:
+            limiter = cls._host_limiters.get(host)
+            if limiter is None:
+                limiter = cls(rate)
+                cls._host_limiters[host] = limiter
+            else:
+                limiter.set_rate(rate)
+            return limiter
+
+    def set_rate(self, rate):
+        """
+        Change the maximum number of requests per second (0 or None disables limiting).
+        """
+        interval = self.rate_interval(rate)
+        with self.lock:
+            self.interval = interval
+
+    def acquire(self):
+        """
+        Block until the caller is allowed to start its next request.
+        """
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_slot - now
+            self.next_slot = max(now, self.next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
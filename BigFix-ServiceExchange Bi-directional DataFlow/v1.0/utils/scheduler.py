@@ -1,7 +1,11 @@
+import os
 import time
+import random
+import threading
 from datetime import datetime, timedelta
 import logging
 import re
+from utils.file_lock import FileLock
 
 class Scheduler:
     def __init__(self, schedule):
@@ -83,4 +87,166 @@ class Scheduler:
                     time.sleep(schedule_value)
         except Exception as e:
             logging.error(f"Scheduler encountered an error: {e}")
-            raise
\ No newline at end of file
+            raise
+
+service_logger = logging.getLogger("service_logger")
+
+
+def parse_iso8601_duration(duration_str):
+    """
+    Parse an ISO 8601 duration such as PT5M or P1DT2H.
+    Returns None for the 'now' schedule, which runs once.
+    """
+    if duration_str.lower() == "now":
+        return None
+    pattern = r"P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?"
+    match = re.fullmatch(pattern, duration_str)
+    if not match or not any(match.groups()):
+        raise ValueError(f"Invalid ISO 8601 duration format: {duration_str}")
+    days, hours, minutes, seconds = (int(group or 0) for group in match.groups())
+    return timedelta(days=days, hours=hours, minutes=minutes, seconds=seconds)
+
+
+def dataflow_lock(lock_dir, name):
+    """
+    Lock file held while dataflow name runs. Scheduled and on-demand runs take the same lock,
+    so a dataflow never runs in two processes at once.
+    """
+    return FileLock(os.path.join(lock_dir, re.sub(r"[^A-Za-z0-9_.-]+", "_", name) + ".lock"))
+
+
+class DataFlowScheduler:
+    """
+    Runs each dataflow on its own schedule in a worker thread.
+    - A dataflow never runs twice at the same time; a lock file also guards against other processes.
+    - A dataflow that is due while its previous run is still going is skipped, or with the
+      "coalesce" policy run once more as soon as the current run finishes.
+    - Starts are delayed by a random jitter and limited by a global concurrency cap.
+    - Missed runs are not replayed; the next run is one interval after the due time was noticed.
+    """
+    def __init__(self, schedules, task, max_concurrent=0, overlap_policy="skip", jitter_seconds=0, lock_dir=None, run_on_start=True):
+        """
+        :param schedules: Dictionary mapping dataflow names to ISO 8601 durations or 'now'.
+        :param task: Function called with the dataflow name to run it.
+        :param max_concurrent: Maximum number of dataflows running at the same time (0 for no limit).
+        :param overlap_policy: "skip" or "coalesce".
+        :param jitter_seconds: Maximum random delay added to each start.
+        :param lock_dir: Directory for the per-dataflow lock files (None disables cross-process locking).
+        :param run_on_start: Run every dataflow as soon as the scheduler starts.
+        """
+        self.task = task
+        self.overlap_policy = overlap_policy
+        self.jitter_seconds = float(jitter_seconds or 0)
+        self.lock_dir = lock_dir
+        self.slots = threading.BoundedSemaphore(int(max_concurrent)) if max_concurrent else None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.running = {}
+        self.pending = set()
+        self.intervals = {}
+        self.next_run_times = {}
+
+        now = datetime.now()
+        for name, schedule in schedules.items():
+            try:
+                interval = parse_iso8601_duration(schedule)
+            except (ValueError, AttributeError) as e:
+                service_logger.error(f"Invalid schedule format for '{name}': {schedule}. Error: {e}")
+                continue
+            self.intervals[name] = interval
+            self.next_run_times[name] = now if run_on_start or interval is None else now + interval
+
+    def tick(self, now=None):
+        """
+        Start every dataflow that is due.
+        """
+        now = now or datetime.now()
+        with self.lock:
+            for name, next_run in self.next_run_times.items():
+                if next_run is None or now < next_run:
+                    continue
+                interval = self.intervals[name]
+                self.next_run_times[name] = now + interval if interval else None
+                if interval:
+                    service_logger.info(f"Next scheduled time for '{name}': {self.next_run_times[name].strftime('%Y-%m-%d %H:%M:%S')}")
+
+                if name in self.running:
+                    if self.overlap_policy == "coalesce":
+                        service_logger.info(f"Dataflow '{name}' is still running. It will run again when the current run finishes.")
+                        self.pending.add(name)
+                    else:
+                        service_logger.warning(f"Dataflow '{name}' is still running. Skipping this run.")
+                    continue
+
+                service_logger.info(f"Starting dataflow thread: {name}")
+                thread = threading.Thread(target=self.run_dataflow, args=(name,), name=f"Dataflow-{name}", daemon=True)
+                self.running[name] = thread
+                thread.start()
+
+    def run_dataflow(self, name):
+        """
+        Worker thread of one dataflow; repeats the run while coalesced runs are pending.
+        """
+        try:
+            while not self.stop_event.is_set():
+                if self.jitter_seconds and self.stop_event.wait(random.uniform(0, self.jitter_seconds)):
+                    return
+                self.execute(name)
+                with self.lock:
+                    if name not in self.pending or self.stop_event.is_set():
+                        return
+                    self.pending.discard(name)
+                service_logger.info(f"Running coalesced run of dataflow '{name}'.")
+        finally:
+            with self.lock:
+                self.running.pop(name, None)
+                self.pending.discard(name)
+
+    def execute(self, name):
+        """
+        Run a dataflow once while holding its lock file and a concurrency slot.
+        """
+        instance_lock = None
+        if self.lock_dir:
+            instance_lock = dataflow_lock(self.lock_dir, name)
+            if not instance_lock.acquire(blocking=False):
+                service_logger.warning(f"Dataflow '{name}' is already running in another process. Skipping this run.")
+                return
+        try:
+            if self.slots is not None:
+                while not self.slots.acquire(timeout=1):
+                    if self.stop_event.is_set():
+                        return
+            try:
+                self.task(name)
+            except Exception as e:
+                service_logger.error(f"Dataflow '{name}' failed: {e}")
+            finally:
+                if self.slots is not None:
+                    self.slots.release()
+        finally:
+            if instance_lock is not None:
+                instance_lock.release()
+
+    def run(self, wait_for_stop=None, poll_interval=1.0):
+        """
+        Run the schedule loop until wait_for_stop(timeout) returns True, or until stop() is called.
+        """
+        wait_for_stop = wait_for_stop or self.stop_event.wait
+        while not self.stop_event.is_set():
+            self.tick()
+            if wait_for_stop(poll_interval):
+                break
+        self.stop()
+
+    def stop(self):
+        """
+        Stop starting new runs and wait for running dataflows to finish.
+        """
+        self.stop_event.set()
+        with self.lock:
+            threads = list(self.running.values())
+        service_logger.info("Waiting for running dataflows to complete...")
+        for thread in threads:
+            thread.join()
+        service_logger.info("All dataflows completed.")
@@ -0,0 +1,65 @@
+import threading
+import time
+
+
+class _Flight:
+    """A load in progress; callers arriving meanwhile wait for its result."""
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+
+
+class SharedSnapshot:
+    """
+    Time-bounded snapshot of data produced by a loader, shared by concurrent consumers.
+    Only one load runs at a time: callers arriving while it is in progress receive its result
+    instead of starting their own. Successful results are reused for ttl seconds.
+    """
+    def __init__(self, loader, ttl=0):
+        """
+        :param loader: Function returning the data, or None if loading failed (failures are not reused).
+        :param ttl: Seconds a loaded snapshot is served to later callers (0 shares in-flight loads only).
+        """
+        self.loader = loader
+        self.ttl = float(ttl or 0)
+        self.value = None
+        self.expires_at = 0.0
+        self.flight = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        """
+        Return the current snapshot, loading it if it expired.
+        """
+        with self.lock:
+            if self.value is not None and time.monotonic() < self.expires_at:
+                return self.value
+            flight = self.flight
+            leader = flight is None
+            if leader:
+                flight = self.flight = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            return flight.value
+
+        value = None
+        try:
+            value = self.loader()
+            return value
+        finally:
+            with self.lock:
+                flight.value = value
+                self.flight = None
+                if value is not None and self.ttl:
+                    self.value = value
+                    self.expires_at = time.monotonic() + self.ttl
+            flight.done.set()
+
+    def invalidate(self):
+        """
+        Drop the stored snapshot so the next caller loads fresh data.
+        """
+        with self.lock:
+            self.value = None
+            self.expires_at = 0.0